@@ -0,0 +1,180 @@
+import asyncio
+import math
+import os
+import time as clock
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+# Admission configuration for the synchronous OCR endpoints
+OCR_MAX_CONCURRENT = int(os.getenv("OCR_MAX_CONCURRENT", "4"))
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", "32"))
+OCR_MAX_PER_USER = int(os.getenv("OCR_MAX_PER_USER", "2"))  # Running plus waiting requests of one user
+OCR_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("OCR_MAX_QUEUE_WAIT_SECONDS", "10"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded, fair admission in front of the OCR engine.
+
+    At most max_concurrent requests run at once and at most max_queue wait.
+    Waiting requests are kept in one queue per user and served round-robin,
+    so a client retrying in a loop only delays its own requests. Anything
+    over the limits is rejected at once with a Retry-After estimate: 429 when
+    the user is over their share, 503 when the server is saturated.
+    Everything runs on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_concurrent: int = OCR_MAX_CONCURRENT, max_queue: int = OCR_MAX_QUEUE,
+                 max_per_user: int = OCR_MAX_PER_USER, max_wait: float = OCR_MAX_QUEUE_WAIT_SECONDS):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_per_user = max(1, max_per_user)
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiting = 0
+        self._per_user = {}
+        self._queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._service_seconds = 1.0  # Moving average of the time a slot is held
+        self._stats = {
+            "admitted": 0,
+            "rejected_user_limit": 0,
+            "rejected_queue_full": 0,
+            "rejected_wait_timeout": 0,
+        }
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def overloaded(self) -> bool:
+        """True when a new request would be rejected whoever sends it"""
+        return self._active >= self.max_concurrent and self._waiting >= self.max_queue
+
+    def shed(self) -> AdmissionRejected:
+        """Count and build the rejection for a request turned away before it was read"""
+        self._stats["rejected_queue_full"] += 1
+        return AdmissionRejected(503, "Photo processing is at capacity", self.retry_after())
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free, from the queue length and service time"""
+        rounds = (self._waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(rounds * self._service_seconds))
+
+    @asynccontextmanager
+    async def slot(self, user: Hashable):
+        """Hold one admission slot for the duration of the block"""
+        await self.acquire(user)
+        started = clock.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = clock.monotonic() - started
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+            self.release(user)
+
+    async def acquire(self, user: Hashable) -> None:
+        if self._per_user.get(user, 0) >= self.max_per_user:
+            self._stats["rejected_user_limit"] += 1
+            raise AdmissionRejected(429, "Too many photos are being processed for this user", self.retry_after())
+
+        if self._active < self.max_concurrent and not self._waiting:
+            self._grant(user, 0.0)
+            return
+
+        if self._waiting >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise AdmissionRejected(503, "Photo processing is at capacity", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._waiting += 1
+        self._per_user[user] = self._per_user.get(user, 0) + 1
+        queued_at = clock.monotonic()
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # The client went away; hand the slot on if it was granted meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release(user)
+            else:
+                self._abandon(user, waiter)
+            raise
+
+        if not waiter.done():
+            self._abandon(user, waiter)
+            self._stats["rejected_wait_timeout"] += 1
+            raise AdmissionRejected(503, "Photo processing is at capacity", self.retry_after())
+        self._record_wait(clock.monotonic() - queued_at)
+
+    def release(self, user: Hashable) -> None:
+        self._active -= 1
+        self._drop_user(user)
+        self._dispatch()
+
+    def _grant(self, user: Hashable, waited: float) -> None:
+        self._active += 1
+        self._per_user[user] = self._per_user.get(user, 0) + 1
+        self._record_wait(waited)
+
+    def _record_wait(self, waited: float) -> None:
+        self._stats["admitted"] += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _drop_user(self, user: Hashable) -> None:
+        remaining = self._per_user.get(user, 0) - 1
+        if remaining > 0:
+            self._per_user[user] = remaining
+        else:
+            self._per_user.pop(user, None)
+
+    def _abandon(self, user: Hashable, waiter: asyncio.Future) -> None:
+        queue = self._queues.get(user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[user]
+        waiter.cancel()
+        self._waiting -= 1
+        self._drop_user(user)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting users in turn"""
+        while self._active < self.max_concurrent and self._queues:
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            # The user goes to the back of the rotation
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            self._waiting -= 1
+            self._active += 1
+            # The waiter records its own wait time once it resumes
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        admitted = self._stats["admitted"]
+        return {
+            **self._stats,
+            "active": self._active,
+            "queued": self._waiting,
+            "queued_users": len(self._queues),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "max_per_user": self.max_per_user,
+            "avg_wait_ms": round(self._wait_total / admitted * 1000, 2) if admitted else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+            "avg_service_ms": round(self._service_seconds * 1000, 2),
+            "retry_after_seconds": self.retry_after(),
+        }
+
+
+ocr_admission = AdmissionController()
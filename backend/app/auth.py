@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from .database import get_db
 from .models import User
 from .schemas import TokenData
+from .user_cache import user_cache
 import os
 
 # Security configuration
@@ -59,9 +60,14 @@ def get_current_user(
     )
 
     token_data = verify_token(credentials.credentials, credentials_exception)
+    user = user_cache.get(db, token_data.email)
+    if user is not None:
+        return user
+
     user = db.query(User).filter(User.email == token_data.email).first()
 
     if user is None:
         raise credentials_exception
 
+    user_cache.put(token_data.email, user)
     return user
@@ -0,0 +1,158 @@
+import hashlib
+import json
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Warped display size bounds, in pixels
+MAX_OUTPUT_SIDE = 1600
+MIN_OUTPUT_SIDE = 32
+MIN_DISPLAY_AREA = 0.001  # Smallest display, as a fraction of the reference photo
+
+
+class Calibration(NamedTuple):
+    """Where the clock display sits in the photos of a fixed terminal, and how to threshold it"""
+    corners: Tuple[Tuple[float, float], ...]  # top-left, top-right, bottom-right, bottom-left
+    reference_size: Tuple[int, int]  # (width, height) of the reference photo
+    output_size: Tuple[int, int]  # (width, height) of the warped display
+    threshold: str = "otsu"  # "otsu" or "adaptive"
+    block_size: int = 31  # adaptive threshold neighbourhood
+    offset: int = 10  # adaptive threshold constant
+    invert: bool = False  # light text on a dark display, the gray image is inverted first
+
+    @property
+    def fingerprint(self) -> str:
+        """Short stable hash, used to keep OCR cache entries of different calibrations apart"""
+        payload = json.dumps(self._asdict(), sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def order_corners(points) -> np.ndarray:
+    """Order four points as top-left, top-right, bottom-right, bottom-left"""
+    points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)],
+    ], dtype=np.float32)
+
+
+def find_display_corners(gray: np.ndarray) -> Optional[np.ndarray]:
+    """Find the largest convex quadrilateral in the photo, usually the display bezel"""
+    height, width = gray.shape[:2]
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    best, best_area = None, width * height * 0.02
+    for contour in contours:
+        perimeter = cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, 0.02 * perimeter, True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        area = cv2.contourArea(approx)
+        # Skip the frame of the photo itself
+        if best_area < area < width * height * 0.95:
+            best, best_area = approx, area
+    return order_corners(best) if best is not None else None
+
+
+def check_corners(corners: np.ndarray, width: int, height: int) -> None:
+    """Reject ordered corners that do not outline a usable display, which the perspective transform cannot handle"""
+    if not np.all(np.isfinite(corners)):
+        raise ValueError("Corners must be finite numbers")
+    if np.any(corners < 0) or np.any(corners[:, 0] > width) or np.any(corners[:, 1] > height):
+        raise ValueError("Corners must lie inside the reference photo")
+    # Repeated or collinear points come out of order_corners as a repeated corner
+    if len({(float(x), float(y)) for x, y in corners}) != 4 or not cv2.isContourConvex(corners):
+        raise ValueError("Corners must outline a convex quadrilateral")
+    if cv2.contourArea(corners) < width * height * MIN_DISPLAY_AREA:
+        raise ValueError("Corners outline an area too small to be the display")
+
+
+def _output_size(corners: np.ndarray) -> Tuple[int, int]:
+    top_left, top_right, bottom_right, bottom_left = corners
+    width = max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left))
+    height = max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right))
+    scale = min(1.0, MAX_OUTPUT_SIDE / max(width, height))
+    return max(MIN_OUTPUT_SIDE, int(width * scale)), max(MIN_OUTPUT_SIDE, int(height * scale))
+
+
+def warp_display(gray: np.ndarray, calibration: Calibration) -> np.ndarray:
+    """Warp the calibrated display region of a photo into a flat, upright image"""
+    height, width = gray.shape[:2]
+    ref_width, ref_height = calibration.reference_size
+    # Photos may come at another resolution than the reference, the corners scale with them
+    corners = np.asarray(calibration.corners, dtype=np.float32) * np.float32([width / ref_width, height / ref_height])
+    out_width, out_height = calibration.output_size
+    target = np.float32([[0, 0], [out_width - 1, 0], [out_width - 1, out_height - 1], [0, out_height - 1]])
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(gray, matrix, (out_width, out_height), flags=cv2.INTER_LINEAR)
+
+
+def apply_threshold(gray: np.ndarray, calibration: Calibration) -> np.ndarray:
+    """Binarize a warped display with the calibrated parameters, dark text on white"""
+    if calibration.invert:
+        gray = cv2.bitwise_not(gray)
+    if calibration.threshold == "adaptive":
+        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                       calibration.block_size, calibration.offset)
+    else:
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+
+def compute_calibration(gray: np.ndarray, corners: Optional[Sequence] = None) -> Calibration:
+    """Compute a calibration from a reference photo of the terminal.
+
+    The display corners are detected unless given. The threshold method is
+    chosen from the warped display: uneven lighting across it calls for an
+    adaptive threshold, a mostly dark display for inverting it first.
+    """
+    height, width = gray.shape[:2]
+    if corners is None:
+        ordered = find_display_corners(gray)
+        if ordered is None:
+            raise ValueError("Could not find the clock display in the reference photo")
+    else:
+        ordered = order_corners(corners)
+    check_corners(ordered, width, height)
+
+    calibration = Calibration(
+        corners=tuple((round(float(x), 1), round(float(y), 1)) for x, y in ordered),
+        reference_size=(width, height),
+        output_size=_output_size(ordered),
+    )
+    display = warp_display(gray, calibration)
+
+    # Light text on a dark display is inverted so the text is always the dark part
+    _, otsu = cv2.threshold(display, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    invert = bool(np.count_nonzero(otsu) < otsu.size // 2)
+    if invert:
+        display = cv2.bitwise_not(display)
+
+    # Closing removes the dark strokes and leaves the background; a wide spread means uneven lighting
+    out_width, out_height = calibration.output_size
+    block_size = max(15, (min(out_width, out_height) // 8) | 1)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (block_size, block_size))
+    background = cv2.morphologyEx(display, cv2.MORPH_CLOSE, kernel)
+    uneven = float(background.std()) > 25
+
+    return calibration._replace(
+        threshold="adaptive" if uneven else "otsu",
+        block_size=block_size,
+        invert=invert,
+    )
+
+
+def calibrate_photo(data: bytes, corners: Optional[Sequence] = None) -> Calibration:
+    """Decode an encoded reference photo and compute its calibration"""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return compute_calibration(image, corners)
@@ -0,0 +1,129 @@
+import os
+
+import cv2
+import numpy as np
+
+# Quality gate configuration, measured on a small grayscale copy of the text region
+OCR_QUALITY_GATE = os.getenv("OCR_QUALITY_GATE", "true").lower() == "true"
+OCR_MIN_FOCUS = float(os.getenv("OCR_MIN_FOCUS", "40"))  # Variance of the Laplacian
+OCR_MIN_HIGHLIGHT = float(os.getenv("OCR_MIN_HIGHLIGHT", "50"))  # 99th percentile gray level, 0-255
+OCR_MAX_BRIGHTNESS = float(os.getenv("OCR_MAX_BRIGHTNESS", "225"))
+OCR_MIN_CONTRAST = float(os.getenv("OCR_MIN_CONTRAST", "12"))  # Standard deviation of the gray levels
+OCR_MAX_CLIPPED_FRACTION = float(os.getenv("OCR_MAX_CLIPPED_FRACTION", "0.4"))  # Pixels at 250-255
+
+QUALITY_PROXY_SIDE = 512
+
+# Messages shown to the user, by rejection reason
+_MESSAGES = {
+    "blurry": "Photo is out of focus, hold the camera still and take it again",
+    "too_dark": "Photo is too dark, take it again with more light",
+    "overexposed": "Photo is overexposed, avoid glare on the display and take it again",
+    "low_contrast": "Text is not readable in the photo, take it closer to the display",
+}
+
+
+class ImageQualityError(Exception):
+    """Raised when a photo is not worth running OCR on"""
+
+    def __init__(self, reason: str, measurements: dict):
+        super().__init__(_MESSAGES.get(reason, reason))
+        self.reason = reason
+        self.measurements = measurements
+
+    def __reduce__(self):
+        # Keep the reason when the error crosses the worker process boundary
+        return self.__class__, (self.reason, self.measurements)
+
+
+def quality_thresholds() -> dict:
+    return {
+        "enabled": OCR_QUALITY_GATE,
+        "min_focus": OCR_MIN_FOCUS,
+        "min_highlight": OCR_MIN_HIGHLIGHT,
+        "max_brightness": OCR_MAX_BRIGHTNESS,
+        "min_contrast": OCR_MIN_CONTRAST,
+        "max_clipped_fraction": OCR_MAX_CLIPPED_FRACTION,
+    }
+
+
+def measure_quality(gray: np.ndarray) -> dict:
+    """Focus and exposure measurements of a grayscale image"""
+    height, width = gray.shape[:2]
+    scale = min(1.0, QUALITY_PROXY_SIDE / float(max(height, width)))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    focus = cv2.Laplacian(gray, cv2.CV_64F).var()
+    histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+    levels = np.arange(256)
+    mean = float(histogram @ levels)
+    contrast = float(np.sqrt(histogram @ (levels - mean) ** 2))
+    # Gray level of the brightest 1%, i.e. how bright the digits themselves are
+    highlight = int(np.searchsorted(np.cumsum(histogram), 0.99))
+
+    return {
+        "focus": round(float(focus), 2),
+        "brightness": round(mean, 2),
+        "contrast": round(contrast, 2),
+        "highlight": min(highlight, 255),
+        "dark_fraction": round(float(histogram[:6].sum()), 4),
+        "bright_fraction": round(float(histogram[250:].sum()), 4),
+    }
+
+
+def check_quality(gray: np.ndarray) -> dict:
+    """Measure a grayscale image and raise ImageQualityError if OCR would not read it"""
+    measurements = measure_quality(gray)
+
+    # LED displays are mostly black background, so a low mean is expected;
+    # a photo is only too dark when even its brightest pixels, the digits, are dim
+    if measurements["highlight"] < OCR_MIN_HIGHLIGHT:
+        raise ImageQualityError("too_dark", measurements)
+    if measurements["brightness"] > OCR_MAX_BRIGHTNESS or measurements["bright_fraction"] > OCR_MAX_CLIPPED_FRACTION:
+        raise ImageQualityError("overexposed", measurements)
+    if measurements["contrast"] < OCR_MIN_CONTRAST:
+        raise ImageQualityError("low_contrast", measurements)
+    if measurements["focus"] < OCR_MIN_FOCUS:
+        raise ImageQualityError("blurry", measurements)
+
+    return measurements
+
+
+def _decode_reduced_gray(frame) -> np.ndarray:
+    """Decode a frame at a quarter of its size, JPEG decoders skip most of the work"""
+    if isinstance(frame, str):
+        buffer = np.fromfile(frame, dtype=np.uint8)
+    else:
+        buffer = np.frombuffer(frame, dtype=np.uint8)
+    gray = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    return gray
+
+
+def score_frames(frames: list) -> list:
+    """Score burst frames for sharpness and contrast, all frames at once.
+
+    The frames are stacked into one array so the Laplacian and the gray level
+    spread are computed with a handful of vectorized operations. Each measure
+    is normalized by the best frame of the burst and the score is their
+    weighted sum, so scores are only comparable within one burst.
+    """
+    grays = [_decode_reduced_gray(frame) for frame in frames]
+    height, width = grays[0].shape[:2]
+    stack = np.stack([
+        gray if gray.shape[:2] == (height, width) else cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+        for gray in grays
+    ]).astype(np.float32)
+
+    # 4-neighbour Laplacian of every frame, borders excluded
+    laplacian = (4 * stack[:, 1:-1, 1:-1] - stack[:, :-2, 1:-1] - stack[:, 2:, 1:-1]
+                 - stack[:, 1:-1, :-2] - stack[:, 1:-1, 2:])
+    sharpness = laplacian.reshape(len(frames), -1).var(axis=1)
+    contrast = stack.reshape(len(frames), -1).std(axis=1)
+
+    scores = 0.7 * sharpness / max(float(sharpness.max()), 1e-6) + 0.3 * contrast / max(float(contrast.max()), 1e-6)
+    return [
+        {"sharpness": round(float(s), 2), "contrast": round(float(c), 2), "score": round(float(total), 4)}
+        for s, c, total in zip(sharpness, contrast, scores)
+    ]
@@ -1,5 +1,9 @@
 from .user import User
 from .time_entry import TimeEntry
 from .monthly_target import MonthlyTarget
+from .ocr_job import OCRJob
+from .device_calibration import DeviceCalibration
+from .photo_blob import PhotoBlob
+from .photo_pack_entry import PhotoPackEntry
 
-__all__ = ['User', 'TimeEntry', 'MonthlyTarget']
+__all__ = ['User', 'TimeEntry', 'MonthlyTarget', 'OCRJob', 'DeviceCalibration', 'PhotoBlob', 'PhotoPackEntry']
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy.sql import func
+from ..database import Base
+
+class DeviceCalibration(Base):
+    __tablename__ = "device_calibrations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(String, unique=True, index=True, nullable=False)  # Sent by terminals in the X-Device-Id header
+    corners = Column(Text, nullable=False)  # JSON [[x, y], ...] of the display in the reference photo
+    reference_width = Column(Integer, nullable=False)
+    reference_height = Column(Integer, nullable=False)
+    output_width = Column(Integer, nullable=False)
+    output_height = Column(Integer, nullable=False)
+    threshold = Column(String, nullable=False, default="otsu")  # "otsu" or "adaptive"
+    block_size = Column(Integer, nullable=False, default=31)
+    offset = Column(Integer, nullable=False, default=10)
+    invert = Column(Boolean, nullable=False, default=False)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+
+class OCRJob(Base):
+    __tablename__ = "ocr_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # "pending", "processing", "done", "failed"
+    photo_path = Column(String, nullable=False)
+    device_id = Column(String, nullable=True)  # Terminal that sent the photo, selects its calibration
+    result = Column(Text, nullable=True)  # JSON encoded PhotoUploadResponse
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from ..database import Base
+
+class PhotoBlob(Base):
+    __tablename__ = "photo_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=False)  # Storage key, "ab/cd/<sha256><ext>"
+    size = Column(Integer, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)  # Time entries whose photo_path is this key
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,13 @@
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from ..database import Base
+
+class PhotoPackEntry(Base):
+    __tablename__ = "photo_pack_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=False)  # Storage key, "ab/cd/<sha256><ext>"
+    pack = Column(String, nullable=False)  # Pack file name in PHOTO_PACK_DIR
+    offset = Column(BigInteger, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
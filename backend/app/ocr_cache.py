@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time as clock
+from collections import OrderedDict
+from datetime import time
+from typing import Optional
+
+# Cache configuration
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "512"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "")  # Empty disables the disk tier
+OCR_CACHE_DISK_MAX_BYTES = int(os.getenv("OCR_CACHE_DISK_MAX_BYTES", str(64 * 1024 * 1024)))
+OCR_CACHE_MAX_AGE_SECONDS = int(os.getenv("OCR_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+def image_digest(data) -> str:
+    """SHA-256 of the image bytes, used as the cache key"""
+    return hashlib.sha256(data).hexdigest()
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _encode(value):
+    if isinstance(value, time):
+        return {"__time__": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _decode(obj: dict):
+    if "__time__" in obj:
+        return time.fromisoformat(obj["__time__"])
+    return obj
+
+
+class OCRResultCache:
+    """Two tier cache of OCRService.process_photo results keyed by image digest.
+
+    The memory tier is an LRU bounded by entry count. The optional disk tier
+    stores one JSON file per digest, is shared by every process pointing at the
+    same directory and is bounded by total size; both tiers drop entries older
+    than max_age_seconds.
+    """
+
+    def __init__(self, max_entries: int = OCR_CACHE_SIZE, disk_dir: str = OCR_CACHE_DIR,
+                 disk_max_bytes: int = OCR_CACHE_DISK_MAX_BYTES,
+                 max_age_seconds: int = OCR_CACHE_MAX_AGE_SECONDS):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._disk_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, digest: str) -> Optional[dict]:
+        now = clock.time()
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                stored_at, result = entry
+                if now - stored_at <= self.max_age_seconds:
+                    self._memory.move_to_end(digest)
+                    self._stats["memory_hits"] += 1
+                    return dict(result)
+                del self._memory[digest]
+                self._stats["evictions"] += 1
+
+        result = self._disk_get(digest, now)
+        with self._lock:
+            if result is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._memory_put(digest, result, now)
+        return dict(result)
+
+    def put(self, digest: str, result: dict) -> None:
+        now = clock.time()
+        with self._lock:
+            self._memory_put(digest, dict(result), now)
+            self._stats["stores"] += 1
+        self._disk_put(digest, result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = lookups - self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_max_entries": self.max_entries,
+                "disk_enabled": self.disk_dir is not None,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes if self.disk_dir else None,
+            }
+
+    def _memory_put(self, digest: str, result: dict, now: float):
+        if self.max_entries <= 0:
+            return
+        self._memory[digest] = (now, result)
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _disk_path(self, digest: str) -> str:
+        return os.path.join(self.disk_dir, digest[:2], f"{digest}.json")
+
+    def _disk_get(self, digest: str, now: float) -> Optional[dict]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(digest)
+        try:
+            if now - os.path.getmtime(path) > self.max_age_seconds:
+                self._disk_remove(path)
+                return None
+            with open(path, "r") as f:
+                result = json.load(f, object_hook=_decode)
+            # Refresh mtime so size eviction drops the least recently used files first
+            os.utime(path)
+            return result
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, digest: str, result: dict):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps(result, default=_encode).encode()
+            # Write to a temp file and rename so readers never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            print(f"Error writing OCR cache entry: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(data)
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _disk_remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes = max(0, self._disk_bytes - size)
+            self._stats["evictions"] += 1
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _scan_disk_bytes(self) -> int:
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _evict_disk(self):
+        """Drop expired files, then the least recently used ones, down to 90% of the budget"""
+        now = clock.time()
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        for path, size, mtime in entries:
+            if total <= target and now - mtime <= self.max_age_seconds:
+                break
+            self._disk_remove(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+
+ocr_cache = OCRResultCache()
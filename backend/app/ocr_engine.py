@@ -0,0 +1,188 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .calibration import Calibration
+from .image_quality import ImageQualityError
+from .ocr_cache import OCRResultCache, file_digest, image_digest, ocr_cache
+from .ocr_metrics import ocr_metrics
+from .ocr_service import ImageSource, OCRService
+
+# Pool configuration
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", "2"))
+OCR_JOB_TIMEOUT = float(os.getenv("OCR_JOB_TIMEOUT", "30"))
+
+# OCRService instance owned by each worker process
+_worker_service: Optional[OCRService] = None
+
+
+class OCREngineError(Exception):
+    """Raised when an OCR job could not be completed by the worker pool"""
+
+
+class OCRTimeoutError(OCREngineError):
+    """Raised when an OCR job exceeds its time budget"""
+
+
+def _init_worker(started=None):
+    """Create the OCRService used by this worker process and report its pid"""
+    global _worker_service
+    _worker_service = OCRService()
+    if started is not None:
+        started.put(os.getpid())
+
+
+def _run_process_photo(image: ImageSource, calibration: Optional[Calibration] = None) -> dict:
+    """Run OCRService.process_photo inside a worker process"""
+    return _worker_service.process_photo(image, calibration=calibration)
+
+
+class OCREngine:
+    """Runs OCRService jobs in a bounded pool of worker processes.
+
+    OpenCV and Tesseract are CPU bound and block, so running them on the event
+    loop stalls every other request. Jobs are dispatched to separate processes,
+    each one bounded by a timeout. A job that hangs or kills its worker gets
+    its pool recycled; jobs that were running next to it are retried once on
+    the fresh pool, so one bad image does not fail its neighbours.
+    """
+
+    def __init__(self, max_workers: int = OCR_POOL_SIZE, timeout: float = OCR_JOB_TIMEOUT,
+                 cache: Optional[OCRResultCache] = ocr_cache):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.cache = cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Workers report their pid here when they start, so a hung one can be killed
+        self._started: Optional[multiprocessing.Queue] = None
+        self._slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" avoids forking a process that already runs threads and an event loop
+            context = multiprocessing.get_context("spawn")
+            self._started = context.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._started,)
+            )
+        return self._executor
+
+    def _worker_pids(self) -> List[int]:
+        """Pids reported by the current pool's workers"""
+        pids = []
+        while True:
+            try:
+                pids.append(self._started.get_nowait())
+            except queue.Empty:
+                return pids
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Tear down a pool whose workers hung or crashed"""
+        if self._executor is not executor:
+            return  # Already replaced by another job
+        pids = self._worker_pids()
+        self._executor = None
+        self._started.close()
+        self._started = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Kill workers that are still busy with a timed out job; shutdown only
+        # stops idle ones, and a crashed pool has already lost its workers
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # One semaphore per event loop; test clients and scripts may run several loops in turn
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.max_workers))
+        return self._slots[1]
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Run a picklable function in the worker pool and await its result.
+
+        Jobs are only handed to the pool when a worker is free, so the
+        timeout covers the time a job runs and not the time it waits.
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._get_slots()
+        for attempt in range(2):
+            await slots.acquire()
+            try:
+                executor = self._get_executor()
+                job = executor.submit(fn, *args)
+            except BaseException:
+                slots.release()
+                raise
+            # The slot is held until the worker is done, even if the caller goes away
+            job.add_done_callback(lambda _: loop.call_soon_threadsafe(slots.release))
+            result = asyncio.wrap_future(job)
+            # Mark the outcome as seen, for when the caller times out or goes away before it
+            result.add_done_callback(lambda f: f.cancelled() or f.exception())
+            try:
+                return await asyncio.wait_for(asyncio.shield(result), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                if job.cancel():
+                    # Never started, so no worker is stuck on it
+                    raise OCRTimeoutError(f"OCR job did not start within {self.timeout:g}s")
+                self._recycle(executor)
+                raise OCRTimeoutError(f"OCR job exceeded {self.timeout:g}s")
+            except BrokenProcessPool:
+                self._recycle(executor)
+                if attempt:
+                    raise OCREngineError("OCR worker process crashed")
+
+    async def process_photo(self, image: ImageSource, digest: Optional[str] = None,
+                            calibration: Optional[Calibration] = None) -> dict:
+        """Process a photo, given as a path or as its encoded bytes, in the worker pool.
+
+        The result cache is checked here, in the API process, so a repeated
+        image never reaches the pool. A device calibration is part of the key.
+        """
+        if self.cache is not None:
+            if digest is None:
+                if isinstance(image, str):
+                    digest = await run_in_threadpool(file_digest, image)
+                else:
+                    digest = image_digest(image)
+            if calibration is not None:
+                digest = f"{digest}-{calibration.fingerprint}"
+            cached = self.cache.get(digest)
+            if cached is not None:
+                # Same marking as OCRService.process_photo: no stage ran for this photo
+                cached.update(ocr_tier="cached", timings={})
+                ocr_metrics.record_result(cached)
+                return cached
+
+        try:
+            result = await self.run(_run_process_photo, image, calibration)
+        except ImageQualityError as e:
+            ocr_metrics.record_rejection(e.reason)
+            raise
+        ocr_metrics.record_result(result)
+        if self.cache is not None:
+            self.cache.put(digest, result)
+        return result
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._started.close()
+            self._started = None
+
+
+ocr_engine = OCREngine()
@@ -0,0 +1,61 @@
+import threading
+
+from .image_quality import quality_thresholds
+
+class OCRMetrics:
+    """Aggregates per-stage timings reported by OCR results.
+
+    Workers run in separate processes, so each result carries its own stage
+    timings back to the API process, where they are accumulated here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._photos = 0
+        self._stages = {}
+        self._tiers = {}
+        self._rejections = {}
+
+    def record_result(self, result: dict) -> None:
+        with self._lock:
+            self._photos += 1
+            tier = result.get("ocr_tier")
+            if tier:
+                self._tiers[tier] = self._tiers.get(tier, 0) + 1
+            for stage, elapsed_ms in (result.get("timings") or {}).items():
+                stats = self._stages.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                stats["count"] += 1
+                stats["total_ms"] += elapsed_ms
+                stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def record_rejection(self, reason: str) -> None:
+        """Count a photo turned away by the quality gate"""
+        with self._lock:
+            self._rejections[reason] = self._rejections.get(reason, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "photos_processed": self._photos,
+                "stages": {
+                    stage: {
+                        "count": stats["count"],
+                        "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                        "max_ms": round(stats["max_ms"], 2),
+                    }
+                    for stage, stats in self._stages.items()
+                },
+                # Share of photos resolved by each OCR tier, see OCRService.recognize;
+                # cache hits are counted as "cached" and add no stage timings
+                "tiers": {
+                    tier: {"count": count, "share": round(count / self._photos, 4)}
+                    for tier, count in self._tiers.items()
+                },
+                "quality_gate": {
+                    "rejections": dict(self._rejections),
+                    "thresholds": quality_thresholds(),
+                },
+            }
+
+
+ocr_metrics = OCRMetrics()
@@ -0,0 +1,81 @@
+import re
+from datetime import datetime, time
+from typing import List, NamedTuple, Optional, Tuple
+
+# One alternation for every token we care about. Dates come first so that
+# "12.05.2024" is read as a date instead of the time 12:05 followed by noise.
+_TOKEN_RE = re.compile(r"""
+    (?P<day>\d{1,2})(?P<date_sep>[/\-.\\])(?P<month>\d{1,2})(?P=date_sep)(?P<year>\d{4})  # dd/mm/yyyy, dd-mm-yyyy, dd.mm.yyyy, dd\mm\yyyy
+  | (?P<colon_hour>\d{1,2}):(?P<colon_minute>\d{2})(?::(?P<second>\d{2}))?                 # 12:30, 12:30:45
+    (?:\s*(?P<colon_ampm>[AP]M))?                                                           # 12:30 PM
+  | (?P<dot_hour>\d{1,2})\.(?P<dot_minute>\d{2})(?:\s*(?P<dot_ampm>[AP]M))?                 # 12.30, 12.30 PM
+  | (?P<h_hour>\d{1,2})h(?P<h_minute>\d{2})?                                                # 12h30, 12h
+""", re.VERBOSE | re.IGNORECASE)
+
+
+class ParsedText(NamedTuple):
+    times: List[time]
+    date: Optional[datetime]
+
+
+def _to_time(hour: str, minute: Optional[str], second: Optional[str], ampm: Optional[str]) -> Optional[time]:
+    hour = int(hour)
+    minute = int(minute) if minute else 0
+    second = int(second) if second else 0
+
+    # Handle 12-hour format
+    if ampm:
+        if ampm.upper() == 'PM' and hour != 12:
+            hour += 12
+        elif ampm.upper() == 'AM' and hour == 12:
+            hour = 0
+
+    if 0 <= hour <= 23 and 0 <= minute <= 59 and 0 <= second <= 59:
+        return time(hour, minute, second)
+    return None
+
+
+def _to_date(day: str, month: str, year: str) -> Optional[datetime]:
+    day, month, year = int(day), int(month), int(year)
+    if not (1 <= day <= 31 and 1 <= month <= 12 and 1900 <= year <= 2100):
+        return None
+    try:
+        # Using noon to avoid timezone issues
+        return datetime(year, month, day, 12, 0, 0)
+    except ValueError:
+        return None  # e.g. 31/02
+
+
+def parse_text(text: str) -> ParsedText:
+    """Find every time and the first valid dd/mm/yyyy date in one pass over the text"""
+    times = []
+    found_date = None
+
+    for match in _TOKEN_RE.finditer(text):
+        groups = match.groupdict()
+        if groups["day"] is not None:
+            if found_date is None:
+                found_date = _to_date(groups["day"], groups["month"], groups["year"])
+            continue
+
+        if groups["colon_hour"] is not None:
+            value = _to_time(groups["colon_hour"], groups["colon_minute"], groups["second"], groups["colon_ampm"])
+        elif groups["dot_hour"] is not None:
+            value = _to_time(groups["dot_hour"], groups["dot_minute"], None, groups["dot_ampm"])
+        else:
+            value = _to_time(groups["h_hour"], groups["h_minute"], None, None)
+
+        if value is not None:
+            times.append(value)
+
+    times.sort()
+    return ParsedText(times=times, date=found_date)
+
+
+def start_end_times(times: List[time]) -> Tuple[Optional[time], Optional[time]]:
+    """First and last time of a sorted list, the end is None for a single time"""
+    if len(times) >= 2:
+        return times[0], times[-1]
+    elif len(times) == 1:
+        return times[0], None
+    return None, None
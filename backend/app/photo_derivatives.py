@@ -0,0 +1,137 @@
+import os
+import threading
+import time as clock
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Union
+
+from PIL import Image, ImageOps
+
+from .photo_store import UPLOADS_DIR
+
+# Derivative cache configuration
+PHOTO_DERIVATIVE_DIR = os.getenv("PHOTO_DERIVATIVE_DIR", os.path.join(UPLOADS_DIR, ".derivatives"))
+PHOTO_DERIVATIVE_CACHE_BYTES = int(os.getenv("PHOTO_DERIVATIVE_CACHE_BYTES", str(512 * 1024 * 1024)))
+PHOTO_DERIVATIVE_QUALITY = int(os.getenv("PHOTO_DERIVATIVE_QUALITY", "80"))
+
+# Longest side in pixels of each derivative
+DERIVATIVE_SIZES = {
+    "thumb": int(os.getenv("PHOTO_THUMB_SIZE", "256")),
+    "medium": int(os.getenv("PHOTO_MEDIUM_SIZE", "1280")),
+}
+
+
+def _render(source: Union[str, BinaryIO], target_path: str, max_side: int) -> None:
+    with Image.open(source) as image:
+        # Phones store the orientation in EXIF; bake it in since the metadata is dropped
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        temp_path = f"{target_path}.{threading.get_ident()}.tmp"
+        image.save(temp_path, "JPEG", quality=PHOTO_DERIVATIVE_QUALITY, optimize=True)
+    os.replace(temp_path, target_path)
+
+
+class DerivativeCache:
+    """Resized JPEG copies of photos, generated on first request and kept on disk.
+
+    Derivatives are named after the source's identity (its content hash for
+    photos in the store), so a cached file never goes stale. The total size
+    is bounded by max_bytes; the least recently served files are evicted
+    first. The in-memory index is rebuilt from the directory on start, using
+    modification times as the last use.
+    """
+
+    def __init__(self, directory: str = PHOTO_DERIVATIVE_DIR, max_bytes: int = PHOTO_DERIVATIVE_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # File name -> size, oldest first
+        self._total_bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def cached(self, source_id: str, variant: str) -> Optional[str]:
+        """Path of an already rendered derivative, None when it has to be rendered"""
+        name = self._name(source_id, variant)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+            self._stats["hits"] += 1
+        return path if os.path.exists(path) else None
+
+    def _name(self, source_id: str, variant: str) -> str:
+        return f"{source_id}-{variant}-{DERIVATIVE_SIZES[variant]}.jpg"
+
+    def get(self, source: Union[str, BinaryIO], source_id: str, variant: str) -> str:
+        """Path of the derivative, rendering it from a file path or file object when it is not cached yet.
+
+        Runs Pillow, so call it from a worker thread.
+        """
+        max_side = DERIVATIVE_SIZES[variant]
+        name = self._name(source_id, variant)
+        path = os.path.join(self.directory, name)
+
+        with self._lock:
+            cached = name in self._entries
+            if cached:
+                self._entries.move_to_end(name)
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+
+        if cached and os.path.exists(path):
+            # Keep the on-disk order in step for the next restart
+            now = clock.time()
+            os.utime(path, (now, now))
+            return path
+
+        # Two requests may render the same file; the rename makes the result the same either way
+        _render(source, path, max_side)
+        self._add(name, os.path.getsize(path))
+        return path
+
+    def _add(self, name: str, size: int) -> None:
+        evicted = []
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self._stats["evictions"] += 1
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old_name))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "files": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+photo_derivatives = DerivativeCache()
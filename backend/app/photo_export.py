@@ -0,0 +1,182 @@
+import csv
+import io
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Query, Session
+
+from .database import SessionLocal
+from .models import PhotoPackEntry, TimeEntry, User
+from .photo_packs import photo_packs
+from .photo_storage import photo_storage
+from .photo_store import photo_store
+
+# Rows fetched from the database at a time while exporting
+PHOTO_EXPORT_BATCH_SIZE = int(os.getenv("PHOTO_EXPORT_BATCH_SIZE", "500"))
+PHOTO_EXPORT_CHUNK_SIZE = 256 * 1024
+PHOTO_EXPORT_MANIFEST_MEMORY = 1024 * 1024  # Manifest rows kept in memory before they spill to a temporary file
+
+_ZIP_EPOCH = datetime(1980, 1, 1)
+
+_MANIFEST_COLUMNS = [
+    "entry_id", "user_id", "username", "full_name", "date", "start_time", "end_time",
+    "total_hours", "is_confirmed", "photo_file", "photo_bytes", "extracted_text",
+]
+
+
+class _ZipSink:
+    """Write-only file object that collects what zipfile writes until it is drained.
+
+    It has no tell() or seek(), so zipfile writes sizes after each member in
+    a data descriptor instead of seeking back, which is what lets the archive
+    be streamed.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _drain(sink: _ZipSink) -> Iterator[bytes]:
+    data = sink.drain()
+    if data:
+        yield data
+
+
+class _ExportRow(NamedTuple):
+    entry: TimeEntry
+    user: User
+    full_path: Optional[str]
+    packed: Optional[PhotoPackEntry]
+    archive_name: str
+    date_time: tuple  # ZIP member timestamp
+
+
+def _format(value: Optional[datetime], fmt: str) -> str:
+    return value.strftime(fmt) if value else ""
+
+
+def _archive_name(entry: TimeEntry, user: User, photo_path: str) -> str:
+    username = re.sub(r"[^\w.-]", "_", user.username or str(user.id))
+    extension = os.path.splitext(photo_path)[1].lower()
+    day = _format(entry.date or entry.start_time, "%Y-%m-%d") or "undated"
+    return f"{username}/{day}_{entry.id}{extension}"
+
+
+def _archive_time(entry: TimeEntry) -> tuple:
+    # ZIP timestamps cannot go before 1980
+    moment = entry.start_time or entry.date or _ZIP_EPOCH
+    return max(moment, _ZIP_EPOCH).timetuple()[:6]
+
+
+def _rows(build_query: Callable[[Session], Query]) -> Iterator[_ExportRow]:
+    """Entries with a photo, read from the database in batches.
+
+    Everything derived from an entry is worked out here, before its member
+    is started, since an error in the middle of the stream would leave the
+    client with a truncated archive.
+    """
+    db = SessionLocal()
+    try:
+        query = build_query(db).filter(TimeEntry.photo_path.isnot(None)).add_entity(User)
+        for entry, user in query.order_by(None).order_by(TimeEntry.id).yield_per(PHOTO_EXPORT_BATCH_SIZE):
+            full_path = photo_store.resolve(entry.photo_path)
+            packed = None
+            if full_path is not None and not os.path.exists(full_path) and photo_store.is_key(entry.photo_path):
+                packed = photo_packs.locate(db, entry.photo_path)
+            yield _ExportRow(entry, user, full_path, packed,
+                             _archive_name(entry, user, entry.photo_path), _archive_time(entry))
+    finally:
+        db.close()
+
+
+def _photo_chunks(photo_path: str, full_path: Optional[str], packed: Optional[PhotoPackEntry]) -> Optional[Iterator[bytes]]:
+    """Content of a photo from the local store, its pack or remote storage, None when it is missing"""
+    if packed is not None:
+        view = photo_packs.read(packed)
+        return (bytes(view[start:start + PHOTO_EXPORT_CHUNK_SIZE]) for start in range(0, len(view), PHOTO_EXPORT_CHUNK_SIZE))
+    try:
+        source = open(full_path, "rb") if full_path else None
+    except OSError:
+        source = None
+    if source is not None:
+        def read_local():
+            with source:
+                yield from iter(lambda: source.read(PHOTO_EXPORT_CHUNK_SIZE), b"")
+        return read_local()
+
+    # One HEAD request, so a missing object is listed without a file instead of breaking the stream
+    key = photo_store.normalize_key(photo_path)
+    if photo_storage.is_local or key is None or photo_storage.stat(key) is None:
+        return None
+    return photo_storage.iter_bytes(key)
+
+
+def stream_photo_archive(build_query: Callable[[Session], Query]) -> Iterator[bytes]:
+    """Yield a ZIP of the photos of the selected time entries plus a CSV manifest.
+
+    Nothing is staged: photos are stored uncompressed (they already are
+    compressed images) and copied into the archive chunk by chunk, and
+    entries are read in batches, so memory stays flat whatever the size of
+    the export. build_query gets the session it should use, because the
+    archive is produced after the request's own session is gone. Photos and
+    manifest rows come from the same pass over the entries, so they always
+    agree; the manifest is collected in a spooled temporary file and added
+    as the last member.
+    """
+    sink = _ZipSink()
+    with tempfile.SpooledTemporaryFile(max_size=PHOTO_EXPORT_MANIFEST_MEMORY, mode="w+", encoding="utf-8", newline="") as rows:
+        writer = csv.writer(rows)
+        writer.writerow(_MANIFEST_COLUMNS)
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for row in _rows(build_query):
+                entry, user = row.entry, row.user
+                chunks = _photo_chunks(entry.photo_path, row.full_path, row.packed)
+                size: Optional[int] = None
+                if chunks is not None:
+                    info = zipfile.ZipInfo(row.archive_name, date_time=row.date_time)
+                    info.compress_type = zipfile.ZIP_STORED
+                    size = 0
+                    with archive.open(info, mode="w", force_zip64=True) as target:
+                        for chunk in chunks:
+                            target.write(chunk)
+                            size += len(chunk)
+                            yield from _drain(sink)
+                    yield from _drain(sink)
+                writer.writerow([
+                    entry.id, user.id, user.username, user.full_name,
+                    _format(entry.date, "%Y-%m-%d"),
+                    _format(entry.start_time, "%Y-%m-%d %H:%M:%S"),
+                    _format(entry.end_time, "%Y-%m-%d %H:%M:%S"),
+                    entry.total_hours if entry.total_hours is not None else "",
+                    entry.is_confirmed,
+                    row.archive_name if size is not None else "",
+                    size if size is not None else "",
+                    entry.extracted_text or "",
+                ])
+
+            rows.seek(0)
+            info = zipfile.ZipInfo("manifest.csv", date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, mode="w", force_zip64=True) as manifest:
+                for text in iter(lambda: rows.read(PHOTO_EXPORT_CHUNK_SIZE), ""):
+                    manifest.write(text.encode("utf-8"))
+                    yield from _drain(sink)
+            yield from _drain(sink)
+    # Central directory
+    yield from _drain(sink)
@@ -0,0 +1,310 @@
+import asyncio
+import os
+import threading
+import time as clock
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .database import SessionLocal
+from .models import OCRJob, PhotoBlob, TimeEntry
+from .photo_packs import photo_packs
+from .photo_store import UPLOADS_DIR, PhotoStore, photo_store
+
+# Garbage collector configuration
+PHOTO_GC_GRACE_SECONDS = int(os.getenv("PHOTO_GC_GRACE_SECONDS", str(72 * 3600)))  # Time a user has to confirm an upload
+PHOTO_GC_INTERVAL_SECONDS = int(os.getenv("PHOTO_GC_INTERVAL_SECONDS", "3600"))
+PHOTO_GC_BATCH_SIZE = int(os.getenv("PHOTO_GC_BATCH_SIZE", "500"))
+
+
+def _photo_storage():
+    # Imported here: photo_storage depends on uploads, which depends on this module
+    from .photo_storage import photo_storage
+    return photo_storage
+
+
+def _referenced(db, names: List[str]) -> Set[str]:
+    """The names in a batch that a time entry, a photo count or an open OCR job still uses"""
+    # Entries from before the photo store hold "uploads/<name>" for legacy files
+    values: Dict[str, str] = {}
+    for name in names:
+        values[name] = name
+        if not photo_store.is_key(name):
+            values[os.path.join(UPLOADS_DIR, name)] = name
+    candidates = list(values)
+
+    referenced = set()
+    for (path,) in db.query(TimeEntry.photo_path).filter(TimeEntry.photo_path.in_(candidates)):
+        referenced.add(values[path])
+    for (key,) in db.query(PhotoBlob.key).filter(PhotoBlob.key.in_(candidates), PhotoBlob.ref_count > 0):
+        referenced.add(values[key])
+    # A finished job's photo can still be confirmed until the job is cleaned up
+    for (path,) in db.query(OCRJob.photo_path).filter(OCRJob.photo_path.in_(candidates), OCRJob.status != "failed"):
+        referenced.add(values[path])
+    return referenced
+
+
+class PhotoGarbageCollector:
+    """Deletes stored photos that nothing refers to, off the request path.
+
+    Uploads that were never confirmed are found by a periodic sweep over the
+    store: files older than the grace period that no time entry, photo count
+    or OCR job mentions are removed in batches. Photos released by the API
+    are queued and deleted by the same background task; each is checked
+    again first, since an identical upload may have been confirmed meanwhile,
+    and one written within the grace period is left for a later sweep, since
+    an identical upload may have just been handed out for confirmation.
+    The sweep also drops local copies of photos published to remote
+    storage, once they are past the grace period; publishing leaves them in
+    place because an identical upload may still be reading the same file.
+    """
+
+    def __init__(self, store: PhotoStore = photo_store, grace_seconds: int = PHOTO_GC_GRACE_SECONDS,
+                 interval: int = PHOTO_GC_INTERVAL_SECONDS, batch_size: int = PHOTO_GC_BATCH_SIZE):
+        self.store = store
+        self.grace_seconds = grace_seconds
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self._queue = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "sweeps": 0,
+            "files_deleted": 0,
+            "bytes_reclaimed": 0,
+            "queued_deleted": 0,
+            "queued_kept": 0,
+            "temp_files_deleted": 0,
+            "local_copies_deleted": 0,
+            "last_sweep_at": None,
+            "last_sweep_ms": None,
+        }
+
+    def enqueue(self, photo_path: str) -> None:
+        """Queue a photo for deletion; safe to call from any thread"""
+        name = photo_path if self.store.is_key(photo_path) else os.path.basename(photo_path)
+        self._queue.append(name)
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def delete_queued(self) -> dict:
+        """Delete queued photos that are still unreferenced and older than the grace period.
+
+        A photo written or re-uploaded within the grace period may have just
+        been handed to a client that has not confirmed it yet, so it is kept
+        and left to a later sweep.
+        """
+        cutoff = clock.time() - self.grace_seconds
+        names = []
+        while self._queue:
+            names.append(self._queue.popleft())
+        report = {"files": 0, "bytes": 0, "kept": 0}
+        for start in range(0, len(names), self.batch_size):
+            batch = list(dict.fromkeys(names[start:start + self.batch_size]))
+            deleted, reclaimed, kept = self._delete_unreferenced(batch, cutoff)
+            report["files"] += deleted
+            report["bytes"] += reclaimed
+            report["kept"] += kept
+        self._add_stats(queued_deleted=report["files"], queued_kept=report["kept"],
+                        files_deleted=report["files"], bytes_reclaimed=report["bytes"])
+        return report
+
+    def sweep(self) -> dict:
+        """Delete every stored photo older than the grace period that nothing refers to"""
+        started = clock.monotonic()
+        cutoff = clock.time() - self.grace_seconds
+        report = {"scanned": 0, "files": 0, "bytes": 0, "temp_files": 0, "local_copies": 0}
+        storage = _photo_storage()
+
+        batch = []
+        for name, _, stat in self.store.scan():
+            report["scanned"] += 1
+            if stat.st_mtime < cutoff:
+                batch.append(name)
+            if len(batch) >= self.batch_size:
+                self._sweep_batch(batch, cutoff, report, storage)
+                batch = []
+        if batch:
+            self._sweep_batch(batch, cutoff, report, storage)
+
+        # Photos already published to remote storage
+        if not storage.is_local:
+            batch = []
+            for stored in storage.scan():
+                report["scanned"] += 1
+                if stored.modified < cutoff:
+                    batch.append(stored.key)
+                if len(batch) >= self.batch_size:
+                    self._sweep_batch(batch, cutoff, report)
+                    batch = []
+            if batch:
+                self._sweep_batch(batch, cutoff, report)
+
+        # Staging files left behind by a crash in the middle of a write
+        with os.scandir(self.store.temp_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        report["temp_files"] += 1
+                except OSError:
+                    continue
+
+        report["elapsed_ms"] = round((clock.monotonic() - started) * 1000, 2)
+        self._add_stats(sweeps=1, files_deleted=report["files"], bytes_reclaimed=report["bytes"],
+                        temp_files_deleted=report["temp_files"], local_copies_deleted=report["local_copies"])
+        with self._lock:
+            self._stats["last_sweep_at"] = datetime.now(timezone.utc).isoformat()
+            self._stats["last_sweep_ms"] = report["elapsed_ms"]
+        return report
+
+    def _sweep_batch(self, batch: List[str], cutoff: float, report: dict, storage=None) -> None:
+        deleted, reclaimed, _ = self._delete_unreferenced(batch, cutoff)
+        report["files"] += deleted
+        report["bytes"] += reclaimed
+        if storage is not None and not storage.is_local:
+            report["local_copies"] += self._delete_local_copies(storage, batch, cutoff)
+
+    def _delete_local_copies(self, storage, names: List[str], cutoff: float) -> int:
+        """Remove local files of photos that remote storage also holds, once they are past the grace period"""
+        removed = 0
+        for name in names:
+            if not self.store.is_key(name):
+                continue
+            path = self.store.path(name)
+            try:
+                # Checked again, since an identical upload may have reused the file since the scan
+                if os.stat(path).st_mtime >= cutoff:
+                    continue
+                stored = storage.stat(name)
+                if stored is None:
+                    # Publishing failed; the local copy is still the only one
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"Error checking photo {name} in {storage.name} storage: {e}")
+                continue
+            removed += 1
+        return removed
+
+    def _delete_unreferenced(self, names: Iterable[str], cutoff: float) -> tuple:
+        """Delete the photos nothing refers to that were last written before cutoff"""
+        names = list(names)
+        storage = _photo_storage()
+        deleted = reclaimed = recent = 0
+        db = SessionLocal()
+        try:
+            referenced = _referenced(db, names)
+            for name in names:
+                if name in referenced:
+                    continue
+                path = self.store.resolve(name)
+                if path is None:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime >= cutoff:
+                        recent += 1
+                        continue
+                    os.remove(path)
+                    size = stat.st_size
+                except FileNotFoundError:
+                    # Packed, published to remote storage, or already removed by another worker process
+                    size, is_recent = self._delete_moved(db, storage, name, cutoff)
+                    recent += is_recent
+                    if size is None:
+                        continue
+                except OSError:
+                    continue
+                deleted += 1
+                reclaimed += size
+        finally:
+            db.close()
+        return deleted, reclaimed, len(referenced) + recent
+
+    def _delete_moved(self, db, storage, name: str, cutoff: float) -> Tuple[Optional[int], bool]:
+        """Delete a photo that is no longer a loose file, as (size deleted, kept because recent)"""
+        if not self.store.is_key(name):
+            return None, False
+        # The bytes stay in the pack; dropping the index entry is what deletes the photo.
+        # A re-upload of a packed photo is written as a new loose file, so no grace applies.
+        size = photo_packs.remove(db, name)
+        if size is not None:
+            db.commit()
+            return size, False
+        if storage.is_local:
+            return None, False
+        try:
+            stored = storage.stat(name)
+            if stored is None:
+                return None, False
+            if stored.modified >= cutoff:
+                return None, True
+            storage.delete(name)
+        except Exception as e:
+            print(f"Error deleting photo {name} from {storage.name} storage: {e}")
+            return None, False
+        return stored.size, False
+
+    def _add_stats(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                self._stats[name] += count
+
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._loop = None
+        # Do not lose deletes queued just before shutdown
+        if self._queue:
+            await run_in_threadpool(self.delete_queued)
+
+    async def _run(self):
+        # The first sweep waits an interval so restarts do not all walk the store at once
+        next_sweep = clock.monotonic() + self.interval
+        while True:
+            self._wake.clear()
+            try:
+                if self._queue:
+                    await run_in_threadpool(self.delete_queued)
+                if clock.monotonic() >= next_sweep:
+                    report = await run_in_threadpool(self.sweep)
+                    if report["files"] or report["temp_files"]:
+                        print(f"Photo GC deleted {report['files']} photos ({report['bytes']} bytes) "
+                              f"and {report['temp_files']} temp files")
+                    next_sweep = clock.monotonic() + self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error collecting photos: {e}")
+                next_sweep = clock.monotonic() + self.interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, next_sweep - clock.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "queued": len(self._queue),
+                "grace_seconds": self.grace_seconds,
+                "interval_seconds": self.interval,
+            }
+
+
+photo_gc = PhotoGarbageCollector()
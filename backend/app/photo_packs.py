@@ -0,0 +1,146 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import PhotoPackEntry
+from .photo_store import UPLOADS_DIR
+
+# Pack configuration
+PHOTO_PACK_DIR = os.getenv("PHOTO_PACK_DIR", os.path.join(UPLOADS_DIR, ".packs"))
+PHOTO_PACK_MAX_BYTES = int(os.getenv("PHOTO_PACK_MAX_BYTES", str(1024 * 1024 * 1024)))  # Start a new pack past this size
+PHOTO_PACK_AGE_MONTHS = int(os.getenv("PHOTO_PACK_AGE_MONTHS", "12"))  # Default age of the photos the pack job moves
+
+_PACK_NAME_PATTERN = re.compile(r"^pack-(\d{6})\.dat$")
+
+
+class PhotoPacks:
+    """Old photos concatenated into a few large append-only pack files.
+
+    Each photo's pack, offset and size live in the photo_pack_entries table,
+    so the files themselves carry no metadata. Reads return a view into a
+    memory map of the pack, which is opened once per process and shared by
+    all requests; nothing is copied and the kernel pages in only the bytes
+    that are actually sent. Packs are only ever appended to, so a map is
+    extended rather than invalidated when a pack grows. Writers hold an
+    flock on the pack directory's lock file, so pack jobs and processes
+    never interleave their appends.
+    """
+
+    def __init__(self, directory: str = PHOTO_PACK_DIR, max_bytes: int = PHOTO_PACK_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._writer_fd: Optional[int] = None
+        self._stats = {"reads": 0, "bytes_read": 0, "maps_opened": 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, pack: str) -> str:
+        if not _PACK_NAME_PATTERN.match(pack):
+            raise ValueError(f"Invalid pack name: {pack}")
+        return os.path.join(self.directory, pack)
+
+    def locate(self, db: Session, key: str) -> Optional[PhotoPackEntry]:
+        return db.query(PhotoPackEntry).filter(PhotoPackEntry.key == key).first()
+
+    def read(self, entry: PhotoPackEntry) -> memoryview:
+        """Content of a packed photo as a view into the pack's memory map.
+
+        Slicing the view is free; only what is converted to bytes is copied.
+        """
+        end = entry.offset + entry.size
+        with self._lock:
+            mapped = self._maps.get(entry.pack)
+            if mapped is None or len(mapped) < end:
+                # First read, or the pack has grown since it was mapped. Views
+                # into the old map keep it alive until they are released.
+                with open(self.path(entry.pack), "rb") as f:
+                    # An empty file cannot be mapped, and a short one does not hold the photo
+                    if os.fstat(f.fileno()).st_size < end:
+                        raise ValueError(f"Pack {entry.pack} is shorter than its index")
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[entry.pack] = mapped
+                self._stats["maps_opened"] += 1
+            self._stats["reads"] += 1
+            self._stats["bytes_read"] += entry.size
+        return memoryview(mapped)[entry.offset:end]
+
+    def remove(self, db: Session, key: str) -> Optional[int]:
+        """Drop a photo from the index, returning its size; the pack keeps the bytes"""
+        entry = self.locate(db, key)
+        if entry is None:
+            return None
+        db.delete(entry)
+        return entry.size
+
+    def _current_pack(self) -> Tuple[str, int]:
+        """The newest pack with room left, or the name of the next one"""
+        numbers = [int(m.group(1)) for m in map(_PACK_NAME_PATTERN.match, os.listdir(self.directory)) if m]
+        number = max(numbers, default=1)
+        name = f"pack-{number:06d}.dat"
+        size = os.path.getsize(self.path(name)) if os.path.exists(self.path(name)) else 0
+        if size >= self.max_bytes:
+            return f"pack-{number + 1:06d}.dat", 0
+        return name, size
+
+    @contextmanager
+    def writing(self):
+        """Exclusive right to append, across threads and processes; waits for other writers"""
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._writer_fd = fd
+            yield
+        finally:
+            self._writer_fd = None
+            os.close(fd)
+
+    def append(self, sources: List[Tuple[str, str]]) -> List[Tuple[str, str, int, int]]:
+        """Append (key, file path) photos to the current pack, checking each against its key's hash.
+
+        Call it inside writing(), which should also cover looking up what is
+        already packed and recording the result. Returns (key, pack, offset,
+        size) for the photos written, after they are on disk. Photos whose
+        content does not match their key are left out. The caller records
+        the result in the index and only then removes the loose files.
+        """
+        if self._writer_fd is None:
+            raise RuntimeError("Pack appends must be made inside writing()")
+        written = []
+        pack, offset = self._current_pack()
+        target = open(self.path(pack), "ab")
+        try:
+            for key, source_path in sources:
+                if offset >= self.max_bytes:
+                    target.flush()
+                    os.fsync(target.fileno())
+                    target.close()
+                    pack, offset = f"pack-{int(pack[5:11]) + 1:06d}.dat", 0
+                    target = open(self.path(pack), "ab")
+                with open(source_path, "rb") as f:
+                    data = f.read()
+                if hashlib.sha256(data).hexdigest() != os.path.basename(key)[:64]:
+                    print(f"Error packing photo {key}: content does not match its key")
+                    continue
+                target.write(data)
+                written.append((key, pack, offset, len(data)))
+                offset += len(data)
+            target.flush()
+            os.fsync(target.fileno())
+        finally:
+            target.close()
+        return written
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "packs_mapped": len(self._maps)}
+
+
+photo_packs = PhotoPacks()
@@ -0,0 +1,182 @@
+import os
+import re
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+
+from .photo_storage import PhotoStorage, StoredObject
+from .uploads import media_type_for, sniff_image_type
+
+# Stored photos never change in place, so clients may keep them
+PHOTO_CACHE_CONTROL = os.getenv("PHOTO_CACHE_CONTROL", "private, max-age=31536000, immutable")
+PHOTO_READ_CHUNK_SIZE = 64 * 1024
+
+_HASH_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})\.")
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def photo_identity(path: str) -> str:
+    """Stable id of a photo file: its content hash, or size and mtime for legacy files"""
+    match = _HASH_NAME_PATTERN.match(os.path.basename(path))
+    if match:
+        return match.group(1)
+    stat = os.stat(path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte of a single byte range; None to ignore the header.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    match = _RANGE_PATTERN.match(header.replace(" ", ""))
+    if not match or match.group(1) == match.group(2) == "":
+        # Malformed or multiple ranges: answer with the whole file
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last n bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def _read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(PHOTO_READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _cache_headers(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": PHOTO_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response when the client already has this version, else None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag))
+    return None
+
+
+def _requested_range(request: Request, etag: str, size: int, headers: dict):
+    """The (start, end) byte range to serve, None for the whole file, or a 416 response"""
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A range is only served when the client's copy is the current one
+    if not range_header or (if_range is not None and if_range != etag):
+        return None
+    try:
+        return _parse_range(range_header, size)
+    except ValueError:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"}
+        )
+
+
+def _partial_response(content, start: int, end: int, size: int, media_type: str, headers: dict) -> Response:
+    return StreamingResponse(
+        content,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers={
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+        }
+    )
+
+
+def photo_response(request: Request, path: str, etag: str) -> Response:
+    """Serve a photo file with validators, caching headers and byte range support"""
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    with open(path, "rb") as f:
+        sniffed = sniff_image_type(f.read(32))
+    media_type = sniffed[0] if sniffed else "application/octet-stream"
+    size = os.path.getsize(path)
+    headers = _cache_headers(etag)
+
+    byte_range = _requested_range(request, etag, size, headers)
+    if isinstance(byte_range, Response):
+        return byte_range
+    if byte_range is not None:
+        start, end = byte_range
+        return _partial_response(_read_range(path, start, end), start, end, size, media_type, headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def storage_response(request: Request, storage: PhotoStorage, stored: StoredObject, etag: str) -> Response:
+    """Stream a photo from photo storage with the same headers and range support as a local file"""
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    media_type = media_type_for(os.path.splitext(stored.key)[1])
+    headers = _cache_headers(etag)
+
+    byte_range = _requested_range(request, etag, stored.size, headers)
+    if isinstance(byte_range, Response):
+        return byte_range
+    if byte_range is not None:
+        start, end = byte_range
+        return _partial_response(storage.aiter_bytes(stored.key, start, end), start, end, stored.size, media_type, headers)
+
+    return StreamingResponse(
+        storage.aiter_bytes(stored.key),
+        media_type=media_type,
+        headers={**headers, "Content-Length": str(stored.size)}
+    )
+
+
+def _view_chunks(view: memoryview) -> Iterator[bytes]:
+    # Only one chunk of the view is copied at a time
+    for start in range(0, len(view), PHOTO_READ_CHUNK_SIZE):
+        yield bytes(view[start:start + PHOTO_READ_CHUNK_SIZE])
+
+
+def content_response(request: Request, content: memoryview, media_type: str, etag: str) -> Response:
+    """Serve a photo already mapped in memory with the same headers and range support as a file"""
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    headers = _cache_headers(etag)
+    byte_range = _requested_range(request, etag, len(content), headers)
+    if isinstance(byte_range, Response):
+        return byte_range
+    if byte_range is not None:
+        start, end = byte_range
+        return _partial_response(_view_chunks(content[start:end + 1]), start, end, len(content), media_type, headers)
+    return StreamingResponse(
+        _view_chunks(content),
+        media_type=media_type,
+        headers={**headers, "Content-Length": str(len(content))}
+    )
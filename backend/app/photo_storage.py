@@ -0,0 +1,259 @@
+import os
+import shutil
+from typing import AsyncIterator, Iterator, NamedTuple, Optional
+
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from .photo_store import PhotoStore, photo_store
+from .uploads import media_type_for
+
+# Storage backend: "local" keeps photos in the uploads directory,
+# "s3" moves them to an S3-compatible bucket once they are processed
+PHOTO_STORAGE_BACKEND = os.getenv("PHOTO_STORAGE_BACKEND", "local")
+PHOTO_STORAGE_REDIRECT = os.getenv("PHOTO_STORAGE_REDIRECT", "true").lower() == "true"  # Serve remote photos via presigned URLs
+PHOTO_STORAGE_CHUNK_SIZE = 256 * 1024
+
+# S3 driver configuration; credentials come from the usual AWS environment variables or instance profile
+PHOTO_S3_BUCKET = os.getenv("PHOTO_S3_BUCKET", "")
+PHOTO_S3_PREFIX = os.getenv("PHOTO_S3_PREFIX", "photos/")
+PHOTO_S3_ENDPOINT_URL = os.getenv("PHOTO_S3_ENDPOINT_URL") or None  # MinIO and other S3-compatible servers
+PHOTO_S3_REGION = os.getenv("PHOTO_S3_REGION") or None
+PHOTO_S3_PRESIGN_SECONDS = int(os.getenv("PHOTO_S3_PRESIGN_SECONDS", "300"))
+
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    modified: float  # Epoch seconds
+
+
+class PhotoStorage:
+    """Where processed photos live, addressed by their photo store key.
+
+    Drivers implement the blocking methods; the a-prefixed versions run them
+    in the thread pool for use on the event loop. Uploads are always written
+    to the local photo store first, since OCR and transcoding work on local
+    files, and publish() copies them to the driver afterwards; the garbage
+    collector removes the local copy later.
+    """
+    name = ""
+    is_local = False
+
+    def put(self, key: str, source_path: str) -> None:
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        raise NotImplementedError
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Content of a photo from start to end, both inclusive"""
+        raise NotImplementedError
+
+    def fetch(self, key: str, target_path: str) -> None:
+        """Copy a photo to a local file"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def scan(self) -> Iterator[StoredObject]:
+        raise NotImplementedError
+
+    def presigned_url(self, key: str) -> Optional[str]:
+        """A time-limited URL clients can read the photo from directly, None if unsupported"""
+        return None
+
+    async def aput(self, key: str, source_path: str) -> None:
+        await run_in_threadpool(self.put, key, source_path)
+
+    async def astat(self, key: str) -> Optional[StoredObject]:
+        return await run_in_threadpool(self.stat, key)
+
+    async def afetch(self, key: str, target_path: str) -> None:
+        await run_in_threadpool(self.fetch, key, target_path)
+
+    async def adelete(self, key: str) -> bool:
+        return await run_in_threadpool(self.delete, key)
+
+    async def apresigned_url(self, key: str) -> Optional[str]:
+        return await run_in_threadpool(self.presigned_url, key)
+
+    def aiter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        return iterate_in_threadpool(self.iter_bytes(key, start, end))
+
+    async def publish(self, key: str, store: PhotoStore = photo_store) -> None:
+        """Copy a processed photo from the local store to this storage.
+
+        The local copy is not removed here: an identical upload shares the
+        same file and may still be in OCR or transcoding, and the local store
+        is always checked first. The garbage collector's sweep removes it
+        once it is past the grace period and this storage holds the photo.
+        When the upload fails the photo simply stays local.
+        """
+        if self.is_local:
+            return
+        try:
+            await self.aput(key, store.path(key))
+        except Exception as e:
+            print(f"Error publishing photo {key} to {self.name} storage: {e}")
+
+
+class LocalPhotoStorage(PhotoStorage):
+    """Photos stay in the local photo store"""
+    name = "local"
+    is_local = True
+
+    def __init__(self, store: PhotoStore = photo_store):
+        self.store = store
+
+    def put(self, key: str, source_path: str) -> None:
+        target = self.store.path(key)
+        if os.path.abspath(source_path) != os.path.abspath(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source_path, target)
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        if not self.store.is_key(key):
+            return None
+        try:
+            stat = os.stat(self.store.path(key))
+        except FileNotFoundError:
+            return None
+        return StoredObject(key=key, size=stat.st_size, modified=stat.st_mtime)
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        with open(self.store.path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(PHOTO_STORAGE_CHUNK_SIZE if remaining is None else min(PHOTO_STORAGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def fetch(self, key: str, target_path: str) -> None:
+        shutil.copyfile(self.store.path(key), target_path)
+
+    def delete(self, key: str) -> bool:
+        return self.store.remove(key)
+
+    def scan(self) -> Iterator[StoredObject]:
+        for key, _, stat in self.store.scan():
+            yield StoredObject(key=key, size=stat.st_size, modified=stat.st_mtime)
+
+
+class S3PhotoStorage(PhotoStorage):
+    """Photos in an S3-compatible bucket (AWS S3, MinIO, Ceph RGW, ...)"""
+    name = "s3"
+
+    def __init__(self, bucket: str = PHOTO_S3_BUCKET, prefix: str = PHOTO_S3_PREFIX,
+                 endpoint_url: Optional[str] = PHOTO_S3_ENDPOINT_URL, region: Optional[str] = PHOTO_S3_REGION,
+                 store: PhotoStore = photo_store):
+        import boto3
+        from botocore.config import Config
+        from botocore.exceptions import ClientError
+        if not bucket:
+            raise RuntimeError("PHOTO_S3_BUCKET is not set")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.store = store
+        self._client_error = ClientError
+        # The client is thread safe; the pool matches the threads that use it
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(signature_version="s3v4", max_pool_connections=32, retries={"max_attempts": 3, "mode": "standard"})
+        )
+
+    def _object_key(self, key: str) -> str:
+        if not self.store.is_key(key):
+            raise ValueError(f"Invalid photo key: {key}")
+        return f"{self.prefix}{key}"
+
+    def put(self, key: str, source_path: str) -> None:
+        # upload_file switches to parallel multipart uploads for large files
+        self._client.upload_file(
+            source_path, self.bucket, self._object_key(key),
+            ExtraArgs={"ContentType": media_type_for(os.path.splitext(key)[1])}
+        )
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        if not self.store.is_key(key):
+            return None
+        try:
+            head = self._client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StoredObject(key=key, size=head["ContentLength"], modified=head["LastModified"].timestamp())
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        body = self._client.get_object(**params)["Body"]
+        try:
+            yield from body.iter_chunks(PHOTO_STORAGE_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def fetch(self, key: str, target_path: str) -> None:
+        self._client.download_file(self.bucket, self._object_key(key), target_path)
+
+    def delete(self, key: str) -> bool:
+        self._client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def scan(self) -> Iterator[StoredObject]:
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(self.prefix):]
+                if self.store.is_key(key):
+                    yield StoredObject(key=key, size=item["Size"], modified=item["LastModified"].timestamp())
+
+    def presigned_url(self, key: str) -> Optional[str]:
+        # Signing is local, no request is made
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=PHOTO_S3_PRESIGN_SECONDS
+        )
+
+
+PHOTO_STORAGE_BACKENDS = {
+    LocalPhotoStorage.name: LocalPhotoStorage,
+    S3PhotoStorage.name: S3PhotoStorage,
+}
+
+def create_photo_storage(name: str = PHOTO_STORAGE_BACKEND) -> PhotoStorage:
+    """Create the configured photo storage, falling back to local storage"""
+    if name not in PHOTO_STORAGE_BACKENDS:
+        raise ValueError(f"Unknown photo storage backend: {name}")
+    try:
+        return PHOTO_STORAGE_BACKENDS[name]()
+    except (ImportError, RuntimeError) as e:
+        print(f"Error loading photo storage {name}, using local: {e}")
+        return LocalPhotoStorage()
+
+
+photo_storage = create_photo_storage()
+
+
+def stat_photo(photo_path: str) -> Optional[StoredObject]:
+    """Size and age of a photo, from the local store first and then the configured storage"""
+    local_path = photo_store.resolve(photo_path)
+    if local_path is not None:
+        try:
+            stat = os.stat(local_path)
+            return StoredObject(key=photo_path, size=stat.st_size, modified=stat.st_mtime)
+        except FileNotFoundError:
+            pass
+    key = photo_store.normalize_key(photo_path)
+    if photo_storage.is_local or key is None:
+        return None
+    return photo_storage.stat(key)
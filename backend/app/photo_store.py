@@ -0,0 +1,124 @@
+import os
+import re
+import uuid
+from typing import Iterator, Optional, Tuple
+
+# Root directory of all stored photos
+UPLOADS_DIR = "uploads"
+
+# Staging area for files still being written; it is on the same filesystem so a rename is atomic
+PHOTO_STORE_TEMP_DIR = os.path.join(UPLOADS_DIR, ".tmp")
+
+# A storage key is "ab/cd/<sha256><ext>", sharded by the first two byte pairs of the hash
+_KEY_PATTERN = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(\.[a-z0-9]{1,5})$")
+_BLOB_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]{1,5})$")
+# Photos stored before the store existed: "uploads/<uuid><ext>"
+_LEGACY_NAME_PATTERN = re.compile(r"^[0-9a-fA-F-]{36}\.[a-z0-9]{1,5}$")
+
+
+class PhotoStore:
+    """Content-addressed photo files under the uploads directory.
+
+    A photo is named by the SHA-256 of its content, so identical uploads end
+    up as one file. Files are written to a staging directory first and then
+    renamed into place, so a reader never sees a half-written photo. How many
+    time entries use a file is tracked in the database by PhotoBlobService.
+    """
+
+    def __init__(self, root: str = UPLOADS_DIR, temp_dir: str = PHOTO_STORE_TEMP_DIR):
+        self.root = root
+        self.temp_dir = temp_dir
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(digest: str, extension: str) -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+    @staticmethod
+    def is_key(key: str) -> bool:
+        return bool(key) and _KEY_PATTERN.match(key) is not None
+
+    def temp_path(self, extension: str = "") -> str:
+        """A fresh staging path for a file that will be put into the store"""
+        return os.path.join(self.temp_dir, f"{uuid.uuid4().hex}{extension}")
+
+    def path(self, key: str) -> str:
+        if not self.is_key(key):
+            raise ValueError(f"Invalid photo key: {key}")
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return self.is_key(key) and os.path.exists(self.path(key))
+
+    def put_file(self, source_path: str, digest: str, extension: str) -> Tuple[str, bool]:
+        """Move a fully written file into the store.
+
+        Returns the key and whether a new file was created; when the same
+        content is already stored the source file is dropped instead.
+        """
+        key = self.key_for(digest, extension)
+        target = self.path(key)
+        if os.path.exists(target):
+            os.remove(source_path)
+            # A fresh upload of an old photo must not look abandoned to the garbage collector
+            os.utime(target)
+            return key, False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source_path, target)
+        return key, True
+
+    def remove(self, key: str) -> bool:
+        """Delete a stored photo, True when a file was removed"""
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def scan(self) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """Every stored photo as (key or legacy name, disk path, stat), shard by shard"""
+        with os.scandir(self.root) as top:
+            for entry in top:
+                if entry.is_file() and _LEGACY_NAME_PATTERN.match(entry.name):
+                    yield entry.name, entry.path, entry.stat()
+                elif entry.is_dir() and len(entry.name) == 2 and not entry.name.startswith("."):
+                    with os.scandir(entry.path) as shards:
+                        for shard in shards:
+                            if shard.is_dir():
+                                yield from self._scan_shard(f"{entry.name}/{shard.name}", shard.path)
+
+    def _scan_shard(self, prefix: str, directory: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+        with os.scandir(directory) as blobs:
+            for blob in blobs:
+                key = f"{prefix}/{blob.name}"
+                if blob.is_file() and self.is_key(key):
+                    yield key, blob.path, blob.stat()
+
+    def resolve(self, photo_path: str) -> Optional[str]:
+        """Disk path of a stored photo from its key, its file name or a legacy uploads path.
+
+        Returns None for anything that does not name a photo in the store, so
+        callers can use it to validate client supplied paths as well.
+        """
+        if not photo_path or ".." in photo_path or photo_path.startswith("/"):
+            return None
+        key = self.normalize_key(photo_path)
+        if key is not None:
+            return self.path(key)
+        name = photo_path.rsplit("/", 1)[-1]
+        if _LEGACY_NAME_PATTERN.match(name):
+            return os.path.join(self.root, name)
+        return None
+
+    def normalize_key(self, photo_path: str) -> Optional[str]:
+        """The storage key named by a key or by its file name, None for anything else"""
+        if self.is_key(photo_path):
+            return photo_path
+        # Clients that only keep the last path segment, e.g. "/admin/photos/<hash>.jpg"
+        blob = _BLOB_NAME_PATTERN.match(photo_path.rsplit("/", 1)[-1])
+        if blob:
+            return self.key_for(blob.group(1), blob.group(2))
+        return None
+
+
+photo_store = PhotoStore()
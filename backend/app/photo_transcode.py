@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from .database import SessionLocal
+from .photo_storage import photo_storage
+from .photo_store import PhotoStore, photo_store
+from .services.photo_blob_service import PhotoBlobService
+from .uploads import sniff_image_type
+
+# Transcoding configuration; PHOTO_TRANSCODE_FORMAT=off keeps photos as uploaded
+PHOTO_TRANSCODE_FORMAT = os.getenv("PHOTO_TRANSCODE_FORMAT", "webp").lower()
+PHOTO_TRANSCODE_QUALITY = int(os.getenv("PHOTO_TRANSCODE_QUALITY", "75"))
+PHOTO_TRANSCODE_MAX_SIDE = int(os.getenv("PHOTO_TRANSCODE_MAX_SIDE", "2048"))
+PHOTO_TRANSCODE_WORKERS = int(os.getenv("PHOTO_TRANSCODE_WORKERS", "1"))  # Threads encoding uploads, apart from the OCR pool
+PHOTO_TRANSCODE_REMEMBERED = 4096  # Stored copies of recent uploads kept in memory, so confirm can use them directly
+
+# Format name: (Pillow format, media type, extension)
+_FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "avif": ("AVIF", "image/avif", ".avif"),  # Needs a Pillow build with AVIF support
+}
+
+
+class TranscodeResult(NamedTuple):
+    key: str  # Key of the stored copy, the original key when nothing changed
+    original_bytes: int
+    stored_bytes: int
+    transcoded: bool
+
+
+def transcode_enabled() -> bool:
+    return PHOTO_TRANSCODE_FORMAT in _FORMATS
+
+
+def encode_compact(source_path: str, target_path: str, fmt: str = PHOTO_TRANSCODE_FORMAT,
+                   quality: int = PHOTO_TRANSCODE_QUALITY, max_side: int = PHOTO_TRANSCODE_MAX_SIDE) -> Optional[Tuple[str, int]]:
+    """Re-encode a photo without its metadata, as (sha256, size) of the new file.
+
+    Returns None when the photo is already in the target format and size.
+    Runs Pillow, so it is meant for a worker process or thread.
+    """
+    pillow_format, media_type, _ = _FORMATS[fmt]
+    with open(source_path, "rb") as f:
+        sniffed = sniff_image_type(f.read(32))
+
+    with Image.open(source_path) as image:
+        if sniffed and sniffed[0] == media_type and max(image.size) <= max_side:
+            return None
+        # Orientation lives in EXIF, which is dropped, so apply it to the pixels
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        # Only what is passed to save() is written: no EXIF, GPS or ICC profile
+        image.save(target_path, pillow_format, quality=quality)
+
+    digest = hashlib.sha256()
+    with open(target_path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest(), os.path.getsize(target_path)
+
+
+class PhotoTranscoder:
+    """Replaces stored photos with a compact re-encoded copy.
+
+    The copy gets its own content-addressed key. The original is kept when
+    the copy is not smaller. Uploads are encoded by a small thread pool of
+    their own, so they do not take OCR workers; Pillow releases the GIL
+    while encoding. Their originals are left in the store: an identical
+    upload may still be reading the file, and the garbage collector removes
+    it once the grace period is over and nothing refers to it.
+
+    Uploads are transcoded and published in the background, after their
+    OCR response has been sent with the original key. Time entries
+    confirmed before that finishes are repointed at the stored copy once it
+    is ready; later confirms use the copy this process remembers, or
+    schedule the upload again, which repoints them.
+    """
+
+    def __init__(self, store: PhotoStore = photo_store, workers: int = PHOTO_TRANSCODE_WORKERS):
+        self.store = store
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Task] = {}  # Upload key -> its background task
+        self._stored: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()  # Upload key -> (stored key, size)
+        self._lock = threading.Lock()
+        self._stats = {"transcoded": 0, "skipped": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def transcode(self, photo_path: str) -> TranscodeResult:
+        """Transcode a stored photo, given by key or legacy path, in this process"""
+        source_path = self.store.resolve(photo_path)
+        if source_path is None:
+            raise ValueError(f"Invalid photo path: {photo_path}")
+        temp_path = self.store.temp_path(_FORMATS[PHOTO_TRANSCODE_FORMAT][2])
+        try:
+            encoded = encode_compact(source_path, temp_path)
+            return self._finish(photo_path, source_path, temp_path, encoded)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="photo-transcode")
+            return self._executor
+
+    async def transcode_async(self, key: str) -> TranscodeResult:
+        """Transcode a stored upload, keeping its original; failures keep the original as the result"""
+        if not transcode_enabled():
+            return TranscodeResult(key=key, original_bytes=0, stored_bytes=0, transcoded=False)
+        source_path = self.store.path(key)
+        temp_path = self.store.temp_path(_FORMATS[PHOTO_TRANSCODE_FORMAT][2])
+        try:
+            loop = asyncio.get_running_loop()
+            encoded = await loop.run_in_executor(self._get_executor(), encode_compact, source_path, temp_path)
+            return await run_in_threadpool(self._finish, key, source_path, temp_path, encoded)
+        except Exception as e:
+            print(f"Error transcoding photo {key}: {e}")
+            self._count("failed")
+            return TranscodeResult(key=key, original_bytes=0, stored_bytes=0, transcoded=False)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _finish(self, photo_path: str, source_path: str, temp_path: str,
+                encoded: Optional[Tuple[str, int]]) -> TranscodeResult:
+        original_bytes = os.path.getsize(source_path)
+        if encoded is None or encoded[1] >= original_bytes:
+            self._count("skipped")
+            return TranscodeResult(key=photo_path, original_bytes=original_bytes, stored_bytes=original_bytes, transcoded=False)
+
+        digest, size = encoded
+        key, _ = self.store.put_file(temp_path, digest, _FORMATS[PHOTO_TRANSCODE_FORMAT][2])
+        with self._lock:
+            self._stats["transcoded"] += 1
+            self._stats["bytes_in"] += original_bytes
+            self._stats["bytes_out"] += size
+        return TranscodeResult(key=key, original_bytes=original_bytes, stored_bytes=size, transcoded=True)
+
+    def schedule(self, key: str) -> None:
+        """Transcode and publish an upload in the background and repoint the time entries that use it"""
+        # Runs after the upload's task already in flight, so the photo is encoded once
+        previous = self._pending.get(key)
+        task = asyncio.get_running_loop().create_task(self._store_upload(key, previous))
+        self._pending[key] = task
+        task.add_done_callback(lambda done: self._pending.pop(key) if self._pending.get(key) is done else None)
+
+    def stored_copy(self, key: str) -> Optional[Tuple[str, int]]:
+        """The (key, size) an upload was stored as, if this process has finished it"""
+        with self._lock:
+            return self._stored.get(key)
+
+    async def _store_upload(self, key: str, previous: Optional[asyncio.Task]) -> None:
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            stored = self.stored_copy(key)
+            if stored is None:
+                result = await self.transcode_async(key)
+                await photo_storage.publish(result.key)
+                stored = (result.key, result.stored_bytes)
+                with self._lock:
+                    self._stored[key] = stored
+                    while len(self._stored) > PHOTO_TRANSCODE_REMEMBERED:
+                        self._stored.popitem(last=False)
+            if stored[0] != key:
+                await run_in_threadpool(_repoint, key, *stored)
+        except Exception as e:
+            print(f"Error storing photo {key}: {e}")
+
+    def shutdown(self):
+        # Unfinished uploads keep their original key, and transcode_photos.py converts them later
+        for task in self._pending.values():
+            task.cancel()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "bytes_saved": self._stats["bytes_in"] - self._stats["bytes_out"],
+                "pending": len(self._pending),
+                "format": PHOTO_TRANSCODE_FORMAT,
+                "quality": PHOTO_TRANSCODE_QUALITY,
+                "max_side": PHOTO_TRANSCODE_MAX_SIDE,
+            }
+
+
+def _repoint(key: str, stored_key: str, size: int) -> None:
+    db = SessionLocal()
+    try:
+        PhotoBlobService.replace_photo(db, key, stored_key, size)
+        db.commit()
+    finally:
+        db.close()
+
+
+photo_transcoder = PhotoTranscoder()
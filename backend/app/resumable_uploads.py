@@ -0,0 +1,262 @@
+import asyncio
+import fcntl
+import json
+import os
+import time as clock
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .ocr_cache import file_digest
+from .photo_store import UPLOADS_DIR, photo_store
+from .uploads import StoredUpload, sniff_image_type
+
+# Resumable upload configuration
+PARTIAL_UPLOADS_DIR = os.path.join(UPLOADS_DIR, ".partial")
+PARTIAL_UPLOAD_TTL_SECONDS = int(os.getenv("PARTIAL_UPLOAD_TTL_SECONDS", str(6 * 3600)))
+PARTIAL_UPLOAD_SWEEP_SECONDS = int(os.getenv("PARTIAL_UPLOAD_SWEEP_SECONDS", "300"))
+PARTIAL_UPLOAD_MAX_PER_USER = int(os.getenv("PARTIAL_UPLOAD_MAX_PER_USER", "5"))  # Unfinished uploads one user may have
+
+
+class PartialUpload(NamedTuple):
+    upload_id: str
+    user_id: int
+    size: int  # Declared total size
+    offset: int  # Bytes received so far
+    filename: Optional[str]
+    updated_at: float
+
+    @property
+    def expires_at(self) -> datetime:
+        return datetime.fromtimestamp(self.updated_at + PARTIAL_UPLOAD_TTL_SECONDS, tz=timezone.utc)
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a chunk does not start where the stored data ends"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload offset is {offset}")
+        self.offset = offset
+
+
+class UploadSizeExceeded(Exception):
+    """Raised when a chunk goes past the declared upload size"""
+
+
+class UploadBusy(Exception):
+    """Raised when another request is writing or finalizing the same upload"""
+
+
+class UploadGone(Exception):
+    """Raised when the upload was finalized or removed by another request"""
+
+
+class UploadLimitExceeded(Exception):
+    """Raised when a user already has the maximum number of unfinished uploads"""
+
+
+class PartialUploadStore:
+    """Partially received uploads kept on local disk between requests.
+
+    Each upload is a data file plus a small JSON metadata file. The offset is
+    the size of the data file, so a chunk cut off by a dropped connection
+    still counts for what reached the disk and the client resumes from there.
+    Uploads not touched for ttl_seconds are removed by expire_stale(), and a
+    user may have at most max_per_user of them open.
+
+    Appends, finalize and expiry hold an flock on a per-upload lock file, so
+    only one of them at a time works on an upload, whichever worker process
+    it runs in; a second one is turned away instead of waiting.
+    """
+
+    def __init__(self, directory: str = PARTIAL_UPLOADS_DIR, ttl_seconds: int = PARTIAL_UPLOAD_TTL_SECONDS,
+                 max_per_user: int = PARTIAL_UPLOAD_MAX_PER_USER):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_per_user = max(1, max_per_user)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    def _lock_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.lock")
+
+    def _try_lock(self, upload_id: str) -> Optional[int]:
+        """The descriptor of the upload's lock file with the lock held, None when someone else holds it"""
+        fd = os.open(self._lock_path(upload_id), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    @contextmanager
+    def _locked(self, upload_id: str):
+        """Hold an upload exclusively, raising UploadBusy or UploadGone"""
+        fd = self._try_lock(upload_id)
+        if fd is None:
+            raise UploadBusy()
+        try:
+            # Checked under the lock: the previous holder may have finalized or removed it
+            if not os.path.exists(self._meta_path(upload_id)) or not os.path.exists(self._data_path(upload_id)):
+                if os.path.exists(self._lock_path(upload_id)):
+                    os.remove(self._lock_path(upload_id))
+                raise UploadGone()
+            yield
+        finally:
+            os.close(fd)
+
+    def create(self, user_id: int, size: int, filename: Optional[str] = None) -> PartialUpload:
+        # Counted without a lock, so concurrent creates can overshoot by a few
+        if self.count_open(user_id) >= self.max_per_user:
+            raise UploadLimitExceeded()
+        upload_id = uuid.uuid4().hex
+        open(self._data_path(upload_id), "wb").close()
+        with open(self._meta_path(upload_id), "w") as f:
+            json.dump({"user_id": user_id, "size": size, "filename": filename}, f)
+        return self.get(upload_id)
+
+    def count_open(self, user_id: int) -> int:
+        """Unfinished uploads of a user"""
+        count = 0
+        for name in os.listdir(self.directory):
+            upload_id, extension = os.path.splitext(name)
+            if extension == ".json":
+                upload = self.get(upload_id)
+                count += upload is not None and upload.user_id == user_id
+        return count
+
+    def get(self, upload_id: str) -> Optional[PartialUpload]:
+        # Ids are generated hex strings; anything else could escape the directory
+        if not upload_id.isalnum():
+            return None
+        try:
+            with open(self._meta_path(upload_id), "r") as f:
+                meta = json.load(f)
+            stat = os.stat(self._data_path(upload_id))
+        except (OSError, ValueError):
+            return None
+        return PartialUpload(
+            upload_id=upload_id,
+            user_id=meta["user_id"],
+            size=meta["size"],
+            offset=stat.st_size,
+            filename=meta.get("filename"),
+            updated_at=stat.st_mtime
+        )
+
+    async def append(self, upload: PartialUpload, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Append a request body at offset and return the new offset"""
+        with self._locked(upload.upload_id):
+            path = self._data_path(upload.upload_id)
+            current = os.path.getsize(path)
+            if offset != current:
+                raise UploadOffsetMismatch(current)
+
+            with open(path, "ab") as f:
+                try:
+                    async for chunk in chunks:
+                        if current + len(chunk) > upload.size:
+                            raise UploadSizeExceeded()
+                        await run_in_threadpool(f.write, chunk)
+                        current += len(chunk)
+                finally:
+                    # Keep whatever arrived before the connection dropped
+                    f.flush()
+            return current
+
+    def finalize(self, upload: PartialUpload) -> StoredUpload:
+        """Move a complete upload into the photo store.
+
+        Raises ValueError when the content is not an image; the partial upload
+        is removed either way.
+        """
+        data_path = self._data_path(upload.upload_id)
+        with self._locked(upload.upload_id):
+            try:
+                with open(data_path, "rb") as f:
+                    sniffed = sniff_image_type(f.read(32))
+                if sniffed is None:
+                    raise ValueError("File must be an image")
+                media_type, extension = sniffed
+                digest = file_digest(data_path)
+                key, created = photo_store.put_file(data_path, digest, extension)
+            finally:
+                self.delete(upload.upload_id)
+        return StoredUpload(key=key, path=photo_store.path(key), size=upload.size, digest=digest,
+                            content_type=media_type, created=created)
+
+    def delete(self, upload_id: str) -> None:
+        for path in (self._data_path(upload_id), self._meta_path(upload_id), self._lock_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def expire_stale(self) -> int:
+        """Remove uploads that were not touched within the TTL"""
+        cutoff = clock.time() - self.ttl_seconds
+        expired = 0
+        for name in os.listdir(self.directory):
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json":
+                continue
+            data_path = self._data_path(upload_id)
+            try:
+                # The data file's mtime moves with every chunk
+                updated_at = os.path.getmtime(data_path if os.path.exists(data_path) else os.path.join(self.directory, name))
+            except OSError:
+                continue
+            if updated_at >= cutoff:
+                continue
+            # A slow append or a finalize may still be working on it; the next sweep looks again
+            fd = self._try_lock(upload_id)
+            if fd is None:
+                continue
+            try:
+                self.delete(upload_id)
+            finally:
+                os.close(fd)
+            expired += 1
+        return expired
+
+
+class PartialUploadSweeper:
+    """Background task that expires abandoned partial uploads"""
+
+    def __init__(self, store: PartialUploadStore, interval: int = PARTIAL_UPLOAD_SWEEP_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                expired = await run_in_threadpool(self.store.expire_stale)
+                if expired:
+                    print(f"Expired {expired} partial uploads")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error expiring partial uploads: {e}")
+            await asyncio.sleep(self.interval)
+
+
+partial_uploads = PartialUploadStore()
+partial_upload_sweeper = PartialUploadSweeper(partial_uploads)
@@ -1,14 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 from typing import List, Optional
 from datetime import datetime, date
+import io
+import json
 import os
+from starlette.concurrency import run_in_threadpool
 from ..database import get_db
-from app.models import User, TimeEntry
+from app.models import PhotoPackEntry, User, TimeEntry
 from ..schemas import User as UserSchema
 from ..auth import get_current_user
+from ..ocr_cache import ocr_cache
+from ..ocr_metrics import ocr_metrics
+from ..ocr_engine import ocr_engine
+from ..admission import ocr_admission
+from ..calibration import calibrate_photo
+from ..uploads import MAX_UPLOAD_BYTES, media_type_for
+from ..photo_store import photo_store
+from ..photo_derivatives import DERIVATIVE_SIZES, photo_derivatives
+from ..photo_transcode import photo_transcoder
+from ..photo_gc import photo_gc
+from ..photo_export import stream_photo_archive
+from ..photo_packs import photo_packs
+from ..photo_responses import content_response, not_modified, photo_identity, photo_response, storage_response
+from ..photo_storage import PHOTO_STORAGE_REDIRECT, photo_storage
+from ..services.device_calibration_service import DeviceCalibrationService
+from ..user_cache import user_cache
 
 router = APIRouter()
 
@@ -39,19 +58,106 @@ async def get_all_users(
     users = db.query(User).all()
     return users
 
-@router.get("/time-entries")
-async def get_all_time_entries(
-    user_id: Optional[int] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    confirmed_only: Optional[bool] = None,
+@router.get("/metrics")
+async def get_metrics(current_user: User = Depends(check_admin_access)):
+    """Get runtime metrics of the OCR pipeline (admin/boss only)"""
+    return {
+        "ocr_cache": ocr_cache.stats(),
+        "ocr_pipeline": ocr_metrics.snapshot(),
+        "ocr_admission": ocr_admission.stats(),
+        "photo_derivatives": photo_derivatives.stats(),
+        "photo_transcode": photo_transcoder.stats(),
+        "photo_gc": photo_gc.stats(),
+        "photo_packs": photo_packs.stats(),
+        "user_cache": user_cache.stats()
+    }
+
+@router.post("/photo-gc")
+async def collect_photos(current_user: User = Depends(check_admin_only)):
+    """Delete unreferenced photos now instead of at the next sweep (admin only)"""
+    queued = await run_in_threadpool(photo_gc.delete_queued)
+    swept = await run_in_threadpool(photo_gc.sweep)
+    return {
+        "files_deleted": queued["files"] + swept["files"],
+        "bytes_reclaimed": queued["bytes"] + swept["bytes"],
+        "temp_files_deleted": swept["temp_files"],
+        "scanned": swept["scanned"],
+        "elapsed_ms": swept["elapsed_ms"]
+    }
+
+@router.post("/devices/{device_id}/calibration")
+async def calibrate_device(
+    device_id: str,
+    file: UploadFile = File(..., description="Reference photo taken by the terminal"),
+    corners: Optional[str] = Form(None, description="JSON [[x, y], ...] of the display corners, detected when omitted"),
+    current_user: User = Depends(check_admin_only),
+    db: Session = Depends(get_db)
+):
+    """Compute and store the calibration of a fixed terminal from a reference photo (admin only)"""
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Reference photo is too large"
+        )
+
+    points = None
+    if corners:
+        try:
+            points = json.loads(corners)
+            if len(points) != 4 or any(len(point) != 2 for point in points):
+                raise ValueError
+            if not all(isinstance(value, (int, float)) for point in points for value in point):
+                raise ValueError
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Corners must be a JSON list of four [x, y] points"
+            )
+
+    try:
+        calibration = await ocr_engine.run(calibrate_photo, data, points)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    DeviceCalibrationService.save_calibration(db, device_id, calibration, current_user.id)
+    return DeviceCalibrationService.to_dict(device_id, calibration)
+
+@router.get("/devices/{device_id}/calibration")
+async def get_device_calibration(
+    device_id: str,
     current_user: User = Depends(check_admin_access),
     db: Session = Depends(get_db)
 ):
-    """Get all time entries with user details (admin/boss only)"""
+    """Get the stored calibration of a terminal (admin/boss only)"""
+    calibration = DeviceCalibrationService.get_calibration(db, device_id)
+    if calibration is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device calibration not found"
+        )
+    return DeviceCalibrationService.to_dict(device_id, calibration)
 
-    # Build query
-    query = db.query(TimeEntry).join(User)
+@router.delete("/devices/{device_id}/calibration")
+async def delete_device_calibration(
+    device_id: str,
+    current_user: User = Depends(check_admin_only),
+    db: Session = Depends(get_db)
+):
+    """Remove the calibration of a terminal, its photos go back to detection (admin only)"""
+    if not DeviceCalibrationService.delete_calibration(db, device_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device calibration not found"
+        )
+    return {"message": "Device calibration deleted"}
+
+def filter_time_entries(query, user_id: Optional[int], start_date: Optional[str],
+                        end_date: Optional[str], confirmed_only: Optional[bool]):
+    """Apply the time entry filters shared by the listing and the photo export"""
 
     # Filter by user if specified
     if user_id:
@@ -82,6 +188,22 @@ async def get_all_time_entries(
     if confirmed_only is not None:
         query = query.filter(TimeEntry.is_confirmed == confirmed_only)
 
+    return query
+
+@router.get("/time-entries")
+async def get_all_time_entries(
+    user_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    confirmed_only: Optional[bool] = None,
+    current_user: User = Depends(check_admin_access),
+    db: Session = Depends(get_db)
+):
+    """Get all time entries with user details (admin/boss only)"""
+
+    # Build query
+    query = filter_time_entries(db.query(TimeEntry).join(User), user_id, start_date, end_date, confirmed_only)
+
     # Order by date (newest first)
     query = query.order_by(TimeEntry.date.desc(), TimeEntry.start_time.desc())
 
@@ -116,6 +238,30 @@ async def get_all_time_entries(
         "entries": formatted_entries
     }
 
+@router.get("/time-entries/photos.zip")
+async def export_time_entry_photos(
+    user_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    confirmed_only: Optional[bool] = None,
+    current_user: User = Depends(check_admin_access),
+    db: Session = Depends(get_db)
+):
+    """Download the photos of the filtered time entries as a ZIP with a CSV manifest (admin/boss only)"""
+
+    # Validate the filters now, the archive is built after the response has started
+    filter_time_entries(db.query(TimeEntry), user_id, start_date, end_date, confirmed_only)
+
+    def build_query(export_db: Session):
+        return filter_time_entries(export_db.query(TimeEntry).join(User), user_id, start_date, end_date, confirmed_only)
+
+    filename = f"photos_{start_date or 'all'}_{end_date or 'all'}.zip"
+    return StreamingResponse(
+        stream_photo_archive(build_query),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/users/{user_id}/time-entries")
 async def get_user_time_entries(
     user_id: int,
@@ -391,6 +537,7 @@ async def update_user_role(
     # Update role
     user.role_type = role_type
     db.commit()
+    user_cache.invalidate([user.email])
     db.refresh(user)
 
     return {"message": f"User role updated to {role_type}", "user": user}
@@ -398,7 +545,10 @@ async def update_user_role(
 @router.get("/photos/{photo_path:path}")
 async def serve_photo(
     photo_path: str,
-    current_user: User = Depends(check_admin_access)
+    request: Request,
+    size: Optional[str] = Query(None, description="Serve a resized copy: 'thumb' or 'medium'"),
+    current_user: User = Depends(check_admin_access),
+    db: Session = Depends(get_db)
 ):
     """Serve photo files (admin/boss only)"""
 
@@ -409,15 +559,81 @@ async def serve_photo(
             detail="Invalid photo path"
         )
 
-    # Construct full path
-    full_path = os.path.join("uploads", photo_path)
+    if size is not None and size not in DERIVATIVE_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid size. Must be one of: {', '.join(DERIVATIVE_SIZES)}"
+        )
+
+    # Accepts a storage key, its file name or a legacy uploads file name.
+    # Published photos keep their local copy until the garbage collector drops it;
+    # old ones may have been moved into a pack file.
+    full_path = photo_store.resolve(photo_path)
+    key = photo_store.normalize_key(photo_path)
+    is_local = full_path is not None and os.path.exists(full_path)
+    packed = stored = None
+    if not is_local and key is not None:
+        packed = photo_packs.locate(db, key)
+        if packed is None and not photo_storage.is_local:
+            stored = await photo_storage.astat(key)
 
     # Check if file exists
-    if not os.path.exists(full_path):
+    if not is_local and packed is None and stored is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Photo not found"
         )
 
-    # Return the file
-    return FileResponse(full_path, media_type="image/*")
+    identity = photo_identity(full_path if is_local else key)
+    if size is None:
+        etag = f'"{identity}"'
+        if is_local:
+            return photo_response(request, full_path, etag)
+        if packed is not None:
+            cached = not_modified(request, etag)
+            if cached is not None:
+                return cached
+            content = await run_in_threadpool(photo_packs.read, packed)
+            return content_response(request, content, media_type_for(os.path.splitext(key)[1]), etag)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        # Let the client read the bytes from the storage service directly
+        url = await photo_storage.apresigned_url(key) if PHOTO_STORAGE_REDIRECT else None
+        if url:
+            return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+        return storage_response(request, photo_storage, stored, etag)
+
+    # A cached derivative carries its own validator, so a revalidation does not render it
+    etag = f'"{identity}-{size}-{DERIVATIVE_SIZES[size]}"'
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    try:
+        derivative_path = await render_derivative(full_path if is_local else None, key, identity, size, packed)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error resizing photo: {str(e)}"
+        )
+    return photo_response(request, derivative_path, etag)
+
+async def render_derivative(local_path: Optional[str], key: Optional[str], identity: str, size: str,
+                            packed: Optional[PhotoPackEntry] = None) -> str:
+    """Path of a derivative, reading the original from its pack or remote storage when it is not local"""
+    if local_path is not None:
+        return await run_in_threadpool(photo_derivatives.get, local_path, identity, size)
+
+    cached = photo_derivatives.cached(identity, size)
+    if cached is not None:
+        return cached
+    if packed is not None:
+        content = await run_in_threadpool(photo_packs.read, packed)
+        return await run_in_threadpool(photo_derivatives.get, io.BytesIO(content), identity, size)
+    temp_path = photo_store.temp_path(os.path.splitext(key)[1])
+    try:
+        await photo_storage.afetch(key, temp_path)
+        return await run_in_threadpool(photo_derivatives.get, temp_path, identity, size)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -1,85 +1,410 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Header, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, date, time
 from typing import List, Optional
+import asyncio
+import json
 import os
-import uuid
 from ..database import get_db
 from app.models import User, TimeEntry
-from ..schemas import TimeEntry as TimeEntrySchema, TimeEntryCreate, TimeEntryUpdate, PhotoUploadResponse, MonthlySummary, DailySummary
+from ..schemas import TimeEntry as TimeEntrySchema, TimeEntryCreate, TimeEntryUpdate, PhotoUploadResponse, BurstUploadResponse, OCRJobStatus, ResumableUploadCreate, ResumableUploadStatus, MonthlySummary, DailySummary
 from ..auth import get_current_user
-from ..ocr_service import OCRService
+from ..ocr_engine import ocr_engine, OCRTimeoutError
+from ..image_quality import ImageQualityError, score_frames
+from ..admission import AdmissionRejected, ocr_admission
+from ..services.ocr_job_service import OCRJobService, ocr_job_worker
+from ..services.device_calibration_service import DeviceCalibrationService
+from ..services.photo_blob_service import PhotoBlobService
+from ..uploads import UPLOADS_DIR, MAX_UPLOAD_BYTES, MAX_BATCH_FILES, MAX_BURST_FRAMES, StoredUpload, store_upload, discard_upload
+from ..photo_store import photo_store
+from ..photo_storage import stat_photo
+from ..photo_gc import photo_gc
+from ..photo_packs import photo_packs
+from ..photo_transcode import photo_transcoder
+from ..resumable_uploads import PartialUpload, UploadBusy, UploadGone, UploadLimitExceeded, UploadOffsetMismatch, UploadSizeExceeded, partial_uploads
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import cast, Date, func
 
 router = APIRouter()
-ocr_service = OCRService()
 
 # Ensure uploads directory exists
-UPLOADS_DIR = "uploads"
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
-@router.post("/upload", response_model=PhotoUploadResponse)
+def ocr_error(e: Exception) -> HTTPException:
+    """Map an OCR failure to the HTTP error returned to the client"""
+    if isinstance(e, AdmissionRejected):
+        return HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if isinstance(e, ImageQualityError):
+        # The reason tells the client which retake hint to show
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"reason": e.reason, "message": str(e), "measurements": e.measurements}
+        )
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT if isinstance(e, OCRTimeoutError) else status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Error processing image: {str(e)}"
+    )
+
+@router.post("/upload", response_model=PhotoUploadResponse, responses={202: {"model": OCRJobStatus}})
 async def upload_photo(
     file: UploadFile = File(...),
+    defer: bool = Query(False, description="Queue OCR and return a job id instead of waiting for the result"),
+    x_device_id: Optional[str] = Header(None, description="Terminal id, selects its stored calibration"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Upload photo and extract time data using OCR"""
 
-    # Validate file type
-    if not file.content_type.startswith("image/"):
+    # Stream the photo to disk; this validates the type and enforces the size limit
+    upload = await store_upload(file)
+    return await process_stored_upload(upload, defer, x_device_id, current_user, db)
+
+async def process_stored_upload(upload: StoredUpload, defer: bool, device_id: Optional[str],
+                                current_user: User, db: Session):
+    """OCR a photo already on disk, or queue it as a job in defer mode"""
+
+    # In job mode the OCR job worker picks the photo up from the database
+    if defer:
+        try:
+            job = OCRJobService.create_job(db, current_user.id, upload.key, device_id)
+        except AdmissionRejected as e:
+            discard_upload(upload)
+            raise ocr_error(e)
+        ocr_job_worker.notify()
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=OCRJobService.to_status(job).model_dump(mode="json")
+        )
+
+    # Process photo with OCR in the worker pool; the digest was computed while streaming
+    calibration = DeviceCalibrationService.get_calibration(db, device_id)
+    try:
+        async with ocr_admission.slot(current_user.id):
+            ocr_result = await ocr_engine.process_photo(upload.path, digest=upload.digest, calibration=calibration)
+    except Exception as e:
+        # Clean up file if OCR fails
+        discard_upload(upload)
+        raise ocr_error(e)
+
+    return PhotoUploadResponse.from_ocr_result(finish_upload(upload), ocr_result)
+
+def finish_upload(upload: StoredUpload) -> str:
+    """Hand an upload the OCR is done with to the background transcoder, returning the key to confirm"""
+    photo_transcoder.schedule(upload.key)
+    return upload.key
+
+@router.post("/upload-batch")
+async def upload_photo_batch(
+    files: List[UploadFile] = File(...),
+    x_device_id: Optional[str] = Header(None, description="Terminal id, selects its stored calibration"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Upload several photos and stream back one NDJSON line per photo as OCR finishes"""
+
+    if len(files) > MAX_BATCH_FILES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File must be an image"
+            detail=f"A batch can have at most {MAX_BATCH_FILES} photos"
         )
 
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOADS_DIR, filename)
+    # Store every photo up front so the streamed response does not depend on the request body
+    stored = []
+    failed = []
+    for index, file in enumerate(files):
+        try:
+            stored.append((index, file.filename, await store_upload(file)))
+        except HTTPException as e:
+            failed.append({
+                "index": index,
+                "filename": file.filename,
+                "status": "error",
+                "status_code": e.status_code,
+                "detail": e.detail
+            })
+
+    calibration = DeviceCalibrationService.get_calibration(db, x_device_id)
+
+    async def process(index: int, filename: str, upload: StoredUpload) -> dict:
+        try:
+            async with ocr_admission.slot(current_user.id):
+                ocr_result = await ocr_engine.process_photo(upload.path, digest=upload.digest, calibration=calibration)
+        except Exception as e:
+            discard_upload(upload)
+            error = ocr_error(e)
+            item = {
+                "index": index,
+                "filename": filename,
+                "status": "error",
+                "status_code": error.status_code,
+                "detail": error.detail
+            }
+            if error.headers and "Retry-After" in error.headers:
+                item["retry_after"] = int(error.headers["Retry-After"])
+            return item
+        return {
+            "index": index,
+            "filename": filename,
+            "status": "ok",
+            "result": PhotoUploadResponse.from_ocr_result(finish_upload(upload), ocr_result).model_dump(mode="json")
+        }
+
+    async def results():
+        for item in failed:
+            yield json.dumps(item) + "\n"
+
+        # A few photos at a time, each through the same admission as a single upload,
+        # so a large batch neither floods the worker pool nor starves other users
+        pending = iter(stored)
+        done: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            for index, filename, upload in pending:
+                try:
+                    item = await process(index, filename, upload)
+                except Exception as e:
+                    # Every photo must produce a line, or the stream below waits forever
+                    item = {"index": index, "filename": filename, "status": "error", "status_code": 500, "detail": str(e)}
+                await done.put(item)
+
+        concurrency = min(ocr_engine.max_workers, ocr_admission.max_per_user, len(stored))
+        tasks = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            for _ in stored:
+                yield json.dumps(await done.get()) + "\n"
+        finally:
+            # Stop outstanding work if the client goes away
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.post("/upload-burst", response_model=BurstUploadResponse)
+async def upload_photo_burst(
+    files: List[UploadFile] = File(...),
+    x_device_id: Optional[str] = Header(None, description="Terminal id, selects its stored calibration"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Upload a short burst of frames of the same scene and OCR only the sharpest one"""
+
+    if len(files) > MAX_BURST_FRAMES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A burst can have at most {MAX_BURST_FRAMES} frames"
+        )
 
-    # Save file
+    frames = []
     try:
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        for file in files:
+            frames.append(await store_upload(file))
     except Exception as e:
+        for frame in frames:
+            discard_upload(frame)
+        if isinstance(e, HTTPException):
+            raise
+        raise ocr_error(e)
+
+    # Scoring decodes every frame in the worker pool, so it holds the same admission slot as the OCR
+    calibration = DeviceCalibrationService.get_calibration(db, x_device_id)
+    best = None
+    try:
+        async with ocr_admission.slot(current_user.id):
+            scores = await ocr_engine.run(score_frames, [frame.path for frame in frames])
+            selected = max(range(len(frames)), key=lambda index: scores[index]["score"])
+            best = frames[selected]
+            for index, frame in enumerate(frames):
+                # Identical frames share one stored file
+                if index != selected and frame.key != best.key:
+                    discard_upload(frame)
+            ocr_result = await ocr_engine.process_photo(best.path, digest=best.digest, calibration=calibration)
+    except Exception as e:
+        for frame in ([best] if best is not None else frames):
+            discard_upload(frame)
+        if best is None and isinstance(e, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error reading frames: {str(e)}"
+            )
+        raise ocr_error(e)
+
+    response = PhotoUploadResponse.from_ocr_result(finish_upload(best), ocr_result)
+    return BurstUploadResponse(
+        **response.model_dump(),
+        selected_frame=selected,
+        frame_scores=[score["score"] for score in scores]
+    )
+
+def get_partial_upload(upload_id: str, current_user: User) -> PartialUpload:
+    upload = partial_uploads.get(upload_id)
+    if upload is None or upload.user_id != current_user.id:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error saving file: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found or expired"
+        )
+    return upload
+
+def partial_upload_error(e: Exception) -> HTTPException:
+    if isinstance(e, UploadBusy):
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is being written by another request"
+        )
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Upload not found or expired"
+    )
+
+def partial_upload_status(upload: PartialUpload) -> ResumableUploadStatus:
+    return ResumableUploadStatus(
+        upload_id=upload.upload_id,
+        offset=upload.offset,
+        size=upload.size,
+        expires_at=upload.expires_at
+    )
+
+@router.post("/uploads", response_model=ResumableUploadStatus, status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    upload_data: ResumableUploadCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Start a resumable upload; the photo is then sent in chunks with PATCH"""
+
+    if upload_data.size <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload size must be positive"
+        )
+    if upload_data.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File is larger than the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
         )
 
-    # Process photo with OCR
     try:
-        ocr_result = ocr_service.process_photo(file_path)
+        upload = await run_in_threadpool(partial_uploads.create, current_user.id, upload_data.size, upload_data.filename)
+    except UploadLimitExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"At most {partial_uploads.max_per_user} uploads can be in progress; finish or cancel one first"
+        )
+    return partial_upload_status(upload)
+
+@router.head("/uploads/{upload_id}")
+async def head_resumable_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Report how much of an upload was received, so the client knows where to resume"""
+
+    upload = get_partial_upload(upload_id, current_user)
+    return Response(headers={"Upload-Offset": str(upload.offset), "Upload-Length": str(upload.size)})
 
-        # Convert time objects to datetime if they exist
-        suggested_start_time = None
-        suggested_end_time = None
+@router.get("/uploads/{upload_id}", response_model=ResumableUploadStatus)
+async def get_resumable_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the status of a resumable upload"""
 
-        if ocr_result["suggested_start_time"]:
-            suggested_start_time = datetime.combine(date.today(), ocr_result["suggested_start_time"])
+    return partial_upload_status(get_partial_upload(upload_id, current_user))
 
-        if ocr_result["suggested_end_time"]:
-            suggested_end_time = datetime.combine(date.today(), ocr_result["suggested_end_time"])
+@router.patch("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def append_resumable_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., description="Offset of the first byte of this chunk"),
+    current_user: User = Depends(get_current_user)
+):
+    """Append the request body to an upload at Upload-Offset"""
 
-        return PhotoUploadResponse(
-            photo_path=file_path,
-            extracted_text=ocr_result["extracted_text"],
-            suggested_start_time=suggested_start_time,
-            suggested_end_time=suggested_end_time,
-            suggested_date=ocr_result.get("suggested_date")
+    upload = get_partial_upload(upload_id, current_user)
+    try:
+        offset = await partial_uploads.append(upload, upload_offset, request.stream())
+    except UploadOffsetMismatch as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload offset is {e.offset}",
+            headers={"Upload-Offset": str(e.offset)}
         )
+    except UploadSizeExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Chunk goes past the declared upload size"
+        )
+    except (UploadBusy, UploadGone) as e:
+        raise partial_upload_error(e)
 
-    except Exception as e:
-        # Clean up file if OCR fails
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)})
+
+@router.post("/uploads/{upload_id}/finalize", response_model=PhotoUploadResponse, responses={202: {"model": OCRJobStatus}})
+async def finalize_resumable_upload(
+    upload_id: str,
+    defer: bool = Query(False, description="Queue OCR and return a job id instead of waiting for the result"),
+    x_device_id: Optional[str] = Header(None, description="Terminal id, selects its stored calibration"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Complete a resumable upload and run OCR on the photo"""
+
+    upload = get_partial_upload(upload_id, current_user)
+    if upload.offset != upload.size:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is incomplete: {upload.offset} of {upload.size} bytes received",
+            headers={"Upload-Offset": str(upload.offset)}
+        )
+
+    try:
+        stored = await run_in_threadpool(partial_uploads.finalize, upload)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except (UploadBusy, UploadGone) as e:
+        raise partial_upload_error(e)
+    except OSError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing image: {str(e)}"
+            detail=f"Error storing upload: {str(e)}"
         )
 
+    return await process_stored_upload(stored, defer, x_device_id, current_user, db)
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_resumable_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Abandon a resumable upload and free its space"""
+
+    upload = get_partial_upload(upload_id, current_user)
+    await run_in_threadpool(partial_uploads.delete, upload.upload_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/ocr-jobs/{job_id}", response_model=OCRJobStatus)
+async def get_ocr_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status of a deferred OCR job, with its result once it is done"""
+
+    job = OCRJobService.get_user_job(db, current_user.id, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="OCR job not found"
+        )
+
+    return OCRJobService.to_status(job)
+
 @router.post("/confirm", response_model=TimeEntrySchema)
 async def confirm_time_entry(
     photo_path: str = Form(...),
@@ -94,8 +419,12 @@ async def confirm_time_entry(
     print(f"DEBUG: Received data - start_time: {start_time}, end_time: {end_time}")
     print(f"DEBUG: start_time type: {type(start_time)}, end_time type: {type(end_time)}")
 
-    # Validate photo path
-    if not os.path.exists(photo_path):
+    # Validate the photo store key returned by the upload
+    stored_photo = await run_in_threadpool(stat_photo, photo_path) if photo_store.is_key(photo_path) else None
+    if stored_photo is None and photo_store.is_key(photo_path):
+        # A photo identical to an old one may have been packed while it was being processed
+        stored_photo = photo_packs.locate(db, photo_path)
+    if stored_photo is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Photo file not found"
@@ -213,6 +542,10 @@ async def confirm_time_entry(
                 detail="You already have an unclosed start time entry for this date. Please register an end time instead."
             )
 
+    # The upload may already be transcoded and published; otherwise its background task repoints the entry
+    stored_copy = photo_transcoder.stored_copy(photo_path) if photo_store.is_key(photo_path) else None
+    photo_key, photo_size = stored_copy or (photo_path, stored_photo.size)
+
     # Create new time entry (for start time only)
     time_entry = TimeEntry(
         user_id=current_user.id,
@@ -220,14 +553,18 @@ async def confirm_time_entry(
         start_time=start_time,
         end_time=None,  # Always None for new entries
         total_hours=None,  # Will be calculated when end time is added
-        photo_path=photo_path,
+        photo_path=photo_key,
         extracted_text=extracted_text,
         is_confirmed=True
     )
 
     db.add(time_entry)
+    PhotoBlobService.add_reference(db, photo_key, photo_size)
     db.commit()
     db.refresh(time_entry)
+    if stored_copy is None and photo_store.is_key(photo_path):
+        # Finished by another process, or still running; either way this repoints the entry afterwards
+        photo_transcoder.schedule(photo_path)
 
     return time_entry
 
@@ -480,14 +817,15 @@ async def delete_time_entry(
             detail="Time entry not found"
         )
 
-    # Delete associated photo file
-    if time_entry.photo_path and os.path.exists(time_entry.photo_path):
-        try:
-            os.remove(time_entry.photo_path)
-        except:
-            pass  # Don't fail if file deletion fails
+    # The photo file is shared by every entry with the same image
+    photo_path = time_entry.photo_path
+    remove_photo = bool(photo_path) and PhotoBlobService.release_reference(db, photo_path)
 
     db.delete(time_entry)
     db.commit()
 
+    # The photo file is deleted in the background once no entry uses it
+    if remove_photo:
+        photo_gc.enqueue(photo_path)
+
     return {"message": "Time entry deleted successfully"}
@@ -4,6 +4,7 @@ from ..database import get_db
 from app.models import User
 from ..schemas import User as UserSchema, UserCreate
 from ..auth import get_current_user, get_password_hash
+from ..user_cache import user_cache
 
 router = APIRouter()
 
@@ -39,6 +40,7 @@ async def update_profile(
             )
 
     # Update user fields
+    old_email = current_user.email
     current_user.email = user_update.email
     current_user.username = user_update.username
     current_user.full_name = user_update.full_name
@@ -48,6 +50,7 @@ async def update_profile(
         current_user.hashed_password = get_password_hash(user_update.password)
 
     db.commit()
+    user_cache.invalidate([old_email, current_user.email])
     db.refresh(current_user)
 
     return current_user
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
 
 # User schemas
 class UserBase(BaseModel):
@@ -73,6 +73,51 @@ class PhotoUploadResponse(BaseModel):
     suggested_end_time: Optional[datetime] = None
     suggested_date: Optional[str] = None
 
+    @classmethod
+    def from_ocr_result(cls, photo_path: str, ocr_result: dict) -> "PhotoUploadResponse":
+        """Build the response from an OCRService.process_photo result"""
+        # Convert time objects to datetime if they exist
+        suggested_start_time = None
+        suggested_end_time = None
+
+        if ocr_result["suggested_start_time"]:
+            suggested_start_time = datetime.combine(date.today(), ocr_result["suggested_start_time"])
+
+        if ocr_result["suggested_end_time"]:
+            suggested_end_time = datetime.combine(date.today(), ocr_result["suggested_end_time"])
+
+        return cls(
+            photo_path=photo_path,
+            extracted_text=ocr_result["extracted_text"],
+            suggested_start_time=suggested_start_time,
+            suggested_end_time=suggested_end_time,
+            suggested_date=ocr_result.get("suggested_date")
+        )
+
+class BurstUploadResponse(PhotoUploadResponse):
+    selected_frame: int
+    frame_scores: List[float]
+
+# Resumable upload schemas
+class ResumableUploadCreate(BaseModel):
+    size: int
+    filename: Optional[str] = None
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    offset: int
+    size: int
+    expires_at: datetime
+
+# OCR job schemas
+class OCRJobStatus(BaseModel):
+    job_id: str
+    status: str  # "pending", "processing", "done", "failed"
+    result: Optional[PhotoUploadResponse] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # Monthly summary schemas
 class DailySummary(BaseModel):
     date: str
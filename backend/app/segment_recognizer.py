@@ -0,0 +1,228 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Glyphs are normalized to this grid before the segments are sampled
+GLYPH_WIDTH = 16
+GLYPH_HEIGHT = 24
+
+# Largest tilt of the display corrected before reading
+MAX_SKEW_DEGREES = 8
+
+# Segment regions on the glyph grid as (y0, y1, x0, x1), in the usual a-g order:
+# a top, b top right, c bottom right, d bottom, e bottom left, f top left, g middle
+_SEGMENT_REGIONS = [
+    (0, 4, 4, 12),
+    (3, 10, 12, 16),
+    (14, 21, 12, 16),
+    (20, 24, 4, 12),
+    (14, 21, 0, 4),
+    (3, 10, 0, 4),
+    (10, 14, 4, 12),
+    # The two holes inside the digit stay dark on every digit, which rules out solid blobs
+    (5, 9, 5, 11),
+    (15, 19, 5, 11),
+]
+
+# Lit segments of each digit, then the two holes; 6, 7 and 9 are drawn two ways depending on the display
+_DIGIT_SEGMENTS = [
+    ("0", "111111000"),
+    ("2", "110110100"),
+    ("3", "111100100"),
+    ("4", "011001100"),
+    ("5", "101101100"),
+    ("6", "101111100"),
+    ("6", "001111100"),
+    ("7", "111000000"),
+    ("7", "111001000"),
+    ("8", "111111100"),
+    ("9", "111101100"),
+    ("9", "111001100"),
+]
+
+
+def _build_masks() -> np.ndarray:
+    masks = np.zeros((len(_SEGMENT_REGIONS), GLYPH_HEIGHT, GLYPH_WIDTH), dtype=np.float32)
+    for index, (y0, y1, x0, x1) in enumerate(_SEGMENT_REGIONS):
+        masks[index, y0:y1, x0:x1] = 1.0
+    # Each mask averages the ink over its region
+    return masks / masks.sum(axis=(1, 2), keepdims=True)
+
+
+_MASKS = _build_masks()
+_TEMPLATES = np.array([[int(lit) for lit in segments] for _, segments in _DIGIT_SEGMENTS], dtype=np.float32)
+_TEMPLATE_LABELS = [label for label, _ in _DIGIT_SEGMENTS]
+
+
+class SegmentReading(NamedTuple):
+    text: str  # One normalized line per row of the display, e.g. "08:15\n12/05/2024"
+    confidence: float  # Lowest confidence of any glyph, 0 when nothing was read
+
+
+def _clean(ink: np.ndarray) -> np.ndarray:
+    """Drop specks, anything touching the border and large blobs such as the display panel"""
+    height, width = ink.shape
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(ink.astype(np.uint8), connectivity=8)
+    x, y, w, h, area = stats[:, 0], stats[:, 1], stats[:, 2], stats[:, 3], stats[:, 4]
+    keep = (
+        (area >= max(4, ink.size // 20000))
+        & (x > 0) & (y > 0) & (x + w < width) & (y + h < height)
+        & ~((w > width // 2) & (h > height // 2))
+    )
+    keep[0] = False  # Background label
+    return keep[labels]
+
+
+def _deskew(ink: np.ndarray) -> np.ndarray:
+    """Rotate the strokes level, picking the angle whose row profile is sharpest"""
+    height, width = ink.shape
+    scale = min(1.0, 256.0 / max(height, width))
+    small = cv2.resize(ink.astype(np.uint8) * 255, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    center = (small.shape[1] / 2.0, small.shape[0] / 2.0)
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 0.25, 0.5):
+        matrix = cv2.getRotationMatrix2D(center, float(angle), 1.0)
+        rotated = cv2.warpAffine(small, matrix, (small.shape[1], small.shape[0]))
+        # Level text lines give tall peaks and empty gaps in the row sums
+        score = float(rotated.sum(axis=1, dtype=np.float64).var())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+
+    if best_angle == 0.0:
+        return ink
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), best_angle, 1.0)
+    rotated = cv2.warpAffine(ink.astype(np.uint8), matrix, (width, height), flags=cv2.INTER_NEAREST)
+    return rotated.astype(bool)
+
+
+def _runs(profile: np.ndarray, max_gap: int) -> List[Tuple[int, int]]:
+    """Start and end of the non-empty stretches of a projection, bridging gaps up to max_gap"""
+    filled = np.flatnonzero(profile)
+    if filled.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(filled) > max_gap + 1)
+    starts = np.concatenate(([filled[0]], filled[breaks + 1]))
+    ends = np.concatenate((filled[breaks], [filled[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _classify_separator(glyph: np.ndarray) -> str:
+    """Name a glyph much shorter than the line: colon, dot or dash, "?" when it is none of them"""
+    rows = _runs(glyph.any(axis=1), max_gap=0)
+    if len(rows) == 2:
+        return ":"
+    height, width = glyph.shape
+    if len(rows) == 1 and width > height * 1.5:
+        return "-"
+    if len(rows) == 1:
+        return "."
+    return "?"
+
+
+def _is_slash(glyph: np.ndarray) -> bool:
+    """A slash leans: its ink sits right at the top and left at the bottom"""
+    height, width = glyph.shape
+    columns = np.arange(width)
+    quarter = max(1, height // 4)
+    top = glyph[:quarter].sum(axis=0)
+    bottom = glyph[-quarter:].sum(axis=0)
+    if not top.any() or not bottom.any():
+        return False
+    shift = (top @ columns) / top.sum() - (bottom @ columns) / bottom.sum()
+    return shift > width * 0.35
+
+
+def _classify_digits(glyphs: List[np.ndarray]) -> Tuple[List[str], np.ndarray]:
+    """Match every glyph against the digit templates at once"""
+    stack = np.stack([
+        cv2.resize(glyph.astype(np.float32), (GLYPH_WIDTH, GLYPH_HEIGHT), interpolation=cv2.INTER_AREA)
+        for glyph in glyphs
+    ])
+    # (glyphs, regions): share of ink in each segment region and hole
+    features = np.einsum("nyx,syx->ns", stack, _MASKS)
+    lit = np.clip((features - 0.15) / 0.5, 0.0, 1.0)
+    # (glyphs, templates): mean distance between the lit segments and each template
+    distances = np.abs(lit[:, None, :] - _TEMPLATES[None, :, :]).mean(axis=2)
+    best = distances.argmin(axis=1)
+    confidence = 1.0 - distances[np.arange(len(glyphs)), best] * 2
+    return [_TEMPLATE_LABELS[index] for index in best], np.clip(confidence, 0.0, 1.0)
+
+
+def _normalize_line(chars: List[str]) -> str:
+    """Turn the digits of a line into HH:MM or dd/mm/yyyy when their count says so"""
+    digits = "".join(char for char in chars if char.isdigit())
+    if len(digits) == 4:
+        return f"{digits[:2]}:{digits[2:]}"
+    if len(digits) == 6 and ":" in chars:
+        return f"{digits[:2]}:{digits[2:4]}:{digits[4:]}"
+    if len(digits) == 8:
+        return f"{digits[:2]}/{digits[2:4]}/{digits[4:]}"
+    return "".join(chars)
+
+
+def _read_lines(ink: np.ndarray) -> SegmentReading:
+    readings = []
+    confidences = []
+
+    for top, bottom in _runs(ink.any(axis=1), max_gap=max(1, ink.shape[0] // 100)):
+        line = ink[top:bottom]
+        line_height = bottom - top
+        if line_height < 8:
+            continue
+
+        # Segment gaps inside a digit are narrower than the spacing between digits
+        columns = _runs(line.any(axis=0), max_gap=max(1, line_height // 12))
+        chars: List[Optional[str]] = []
+        digit_glyphs = []
+        for left, right in columns:
+            glyph = line[:, left:right]
+            rows = np.flatnonzero(glyph.any(axis=1))
+            glyph = glyph[rows[0]:rows[-1] + 1]
+            height, width = glyph.shape
+
+            if height < line_height * 0.6:
+                chars.append(_classify_separator(glyph))
+            elif _is_slash(glyph):
+                chars.append("/")
+            elif width < height * 0.35:
+                # A lone right-hand pair of segments, too narrow to sample
+                chars.append("1")
+                confidences.append(float(glyph.mean()) if glyph.mean() > 0.5 else 0.0)
+            else:
+                chars.append(None)
+                digit_glyphs.append(glyph)
+
+        if digit_glyphs:
+            labels, confidence = _classify_digits(digit_glyphs)
+            confidences.extend(confidence.tolist())
+            labels = iter(labels)
+            chars = [next(labels) if char is None else char for char in chars]
+
+        # Anything unreadable means this is not a clock display, leave it to tesseract
+        if "?" in chars:
+            return SegmentReading(text="", confidence=0.0)
+        readings.append(_normalize_line(chars))
+
+    if not confidences:
+        return SegmentReading(text="", confidence=0.0)
+    return SegmentReading(text="\n".join(readings), confidence=round(min(confidences), 4))
+
+
+def read_segments(binary: np.ndarray) -> SegmentReading:
+    """Read the digits of a clock display from a binarized image.
+
+    Lines and glyphs are split with row and column projections, which keeps
+    the separate segments of one digit together. Each glyph is resized to a
+    small grid and the ink share of its seven segment regions is compared
+    with every digit template in one vectorized step. Both polarities are
+    tried, LED displays show light digits and LCD displays dark ones.
+    """
+    dark = binary < 128
+    best = SegmentReading(text="", confidence=0.0)
+    for ink in (dark, ~dark):
+        reading = _read_lines(_deskew(_clean(ink)))
+        if reading.confidence > best.confidence:
+            best = reading
+    return best
@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+import time as clock
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.calibration import Calibration
+from app.models.device_calibration import DeviceCalibration
+
+# Seconds a calibration (or its absence) is served from memory before the database is read again
+DEVICE_CALIBRATION_CACHE_SECONDS = float(os.getenv("DEVICE_CALIBRATION_CACHE_SECONDS", "300"))
+
+# device_id -> (loaded_at, Calibration or None)
+_calibrations = {}
+_calibrations_lock = threading.Lock()
+
+class DeviceCalibrationService:
+    @staticmethod
+    def to_calibration(row: DeviceCalibration) -> Calibration:
+        return Calibration(
+            corners=tuple(tuple(point) for point in json.loads(row.corners)),
+            reference_size=(row.reference_width, row.reference_height),
+            output_size=(row.output_width, row.output_height),
+            threshold=row.threshold,
+            block_size=row.block_size,
+            offset=row.offset,
+            invert=row.invert
+        )
+
+    @staticmethod
+    def to_dict(device_id: str, calibration: Calibration) -> dict:
+        return {"device_id": device_id, "fingerprint": calibration.fingerprint, **calibration._asdict()}
+
+    @staticmethod
+    def get_calibration(db: Session, device_id: Optional[str]) -> Optional[Calibration]:
+        """Calibration of a device, from memory when it was looked up recently"""
+        if not device_id:
+            return None
+        now = clock.monotonic()
+        with _calibrations_lock:
+            cached = _calibrations.get(device_id)
+        if cached is not None and now - cached[0] < DEVICE_CALIBRATION_CACHE_SECONDS:
+            return cached[1]
+
+        row = db.query(DeviceCalibration).filter(DeviceCalibration.device_id == device_id).first()
+        calibration = DeviceCalibrationService.to_calibration(row) if row else None
+        # Unknown devices are cached too, so every upload does not hit the database
+        with _calibrations_lock:
+            _calibrations[device_id] = (now, calibration)
+        return calibration
+
+    @staticmethod
+    def save_calibration(db: Session, device_id: str, calibration: Calibration, user_id: int) -> DeviceCalibration:
+        row = db.query(DeviceCalibration).filter(DeviceCalibration.device_id == device_id).first()
+        if row is None:
+            row = DeviceCalibration(device_id=device_id)
+            db.add(row)
+        row.corners = json.dumps([list(point) for point in calibration.corners])
+        row.reference_width, row.reference_height = calibration.reference_size
+        row.output_width, row.output_height = calibration.output_size
+        row.threshold = calibration.threshold
+        row.block_size = calibration.block_size
+        row.offset = calibration.offset
+        row.invert = calibration.invert
+        row.created_by = user_id
+        db.commit()
+        db.refresh(row)
+
+        with _calibrations_lock:
+            _calibrations[device_id] = (clock.monotonic(), calibration)
+        return row
+
+    @staticmethod
+    def delete_calibration(db: Session, device_id: str) -> bool:
+        deleted = db.query(DeviceCalibration).filter(
+            DeviceCalibration.device_id == device_id
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        with _calibrations_lock:
+            _calibrations.pop(device_id, None)
+        return bool(deleted)
@@ -0,0 +1,265 @@
+import asyncio
+import math
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.admission import AdmissionRejected
+from app.database import SessionLocal
+from app.models.ocr_job import OCRJob
+from app.ocr_engine import ocr_engine
+from app.photo_store import photo_store
+from app.photo_transcode import photo_transcoder
+from app.schemas import OCRJobStatus, PhotoUploadResponse
+from app.services.device_calibration_service import DeviceCalibrationService
+
+# Worker configuration
+OCR_JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", "2"))
+OCR_JOB_POLL_INTERVAL = float(os.getenv("OCR_JOB_POLL_INTERVAL", "2"))
+OCR_JOB_STALE_SECONDS = int(os.getenv("OCR_JOB_STALE_SECONDS", "300"))
+OCR_JOB_MAX_ATTEMPTS = int(os.getenv("OCR_JOB_MAX_ATTEMPTS", "3"))
+OCR_JOB_RETENTION_HOURS = int(os.getenv("OCR_JOB_RETENTION_HOURS", "72"))
+OCR_JOB_MAX_PER_USER = int(os.getenv("OCR_JOB_MAX_PER_USER", "10"))  # Unfinished jobs one user may have
+OCR_JOB_MAX_QUEUE = int(os.getenv("OCR_JOB_MAX_QUEUE", "500"))  # Pending jobs of all users
+
+class OCRJobService:
+    @staticmethod
+    def create_job(db: Session, user_id: int, photo_path: str, device_id: Optional[str] = None) -> OCRJob:
+        """Queue a photo for OCR, rejecting it like a synchronous upload when the user or the queue is over its limit.
+
+        The counts are not locked, so concurrent uploads can overshoot a
+        limit by a few jobs; the limits only need to stop a flood.
+        """
+        unfinished = db.query(func.count(OCRJob.id)).filter(
+            OCRJob.user_id == user_id,
+            OCRJob.status.in_(["pending", "processing"])
+        ).scalar()
+        if unfinished >= OCR_JOB_MAX_PER_USER:
+            raise AdmissionRejected(429, "Too many photos are queued for this user", ocr_job_worker.retry_after(unfinished))
+        pending = db.query(func.count(OCRJob.id)).filter(OCRJob.status == "pending").scalar()
+        if pending >= OCR_JOB_MAX_QUEUE:
+            raise AdmissionRejected(503, "Photo processing is at capacity", ocr_job_worker.retry_after(pending))
+
+        job = OCRJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            status="pending",
+            photo_path=photo_path,
+            device_id=device_id,
+            attempts=0
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    @staticmethod
+    def get_user_job(db: Session, user_id: int, job_id: str) -> Optional[OCRJob]:
+        return db.query(OCRJob).filter(
+            OCRJob.id == job_id,
+            OCRJob.user_id == user_id
+        ).first()
+
+    @staticmethod
+    def to_status(job: OCRJob) -> OCRJobStatus:
+        result = None
+        if job.status == "done" and job.result:
+            result = PhotoUploadResponse.model_validate_json(job.result)
+        return OCRJobStatus(
+            job_id=job.id,
+            status=job.status,
+            result=result,
+            error=job.error,
+            created_at=job.created_at,
+            finished_at=job.finished_at
+        )
+
+    @staticmethod
+    def claim_next(db: Session) -> Optional[OCRJob]:
+        """Move the next pending job to "processing" and return it.
+
+        Users take turns: the next job is the oldest one of the user whose
+        last job started longest ago, so one user queueing many photos only
+        delays their own. The conditional UPDATE makes the claim atomic, so
+        several API processes can share the same table without running a
+        job twice.
+        """
+        last_started = db.query(
+            OCRJob.user_id,
+            func.max(OCRJob.started_at).label("started_at")
+        ).group_by(OCRJob.user_id).subquery()
+        while True:
+            job = db.query(OCRJob).outerjoin(
+                last_started, last_started.c.user_id == OCRJob.user_id
+            ).filter(
+                OCRJob.status == "pending"
+            ).order_by(
+                # Users without a started job come first
+                last_started.c.started_at.isnot(None),
+                last_started.c.started_at,
+                OCRJob.created_at,
+                OCRJob.id
+            ).first()
+            if not job:
+                return None
+
+            claimed = db.query(OCRJob).filter(
+                OCRJob.id == job.id,
+                OCRJob.status == "pending"
+            ).update({
+                "status": "processing",
+                "started_at": datetime.now(timezone.utc),
+                "attempts": OCRJob.attempts + 1
+            }, synchronize_session=False)
+            db.commit()
+
+            if claimed:
+                db.refresh(job)
+                return job
+
+    @staticmethod
+    def complete_job(db: Session, job_id: str, result: PhotoUploadResponse) -> None:
+        db.query(OCRJob).filter(OCRJob.id == job_id).update({
+            "status": "done",
+            "result": result.model_dump_json(),
+            "error": None,
+            "finished_at": datetime.now(timezone.utc)
+        }, synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def fail_job(db: Session, job_id: str, error: str) -> None:
+        db.query(OCRJob).filter(OCRJob.id == job_id).update({
+            "status": "failed",
+            "error": error,
+            "finished_at": datetime.now(timezone.utc)
+        }, synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def requeue_stale_jobs(db: Session) -> int:
+        """Return jobs left in "processing" by a dead worker to the queue"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=OCR_JOB_STALE_SECONDS)
+        stale = db.query(OCRJob).filter(
+            OCRJob.status == "processing",
+            OCRJob.started_at < cutoff
+        )
+        failed = stale.filter(OCRJob.attempts >= OCR_JOB_MAX_ATTEMPTS).update({
+            "status": "failed",
+            "error": "OCR job was abandoned too many times",
+            "finished_at": datetime.now(timezone.utc)
+        }, synchronize_session=False)
+        requeued = stale.filter(OCRJob.attempts < OCR_JOB_MAX_ATTEMPTS).update({
+            "status": "pending",
+            "started_at": None
+        }, synchronize_session=False)
+        db.commit()
+        return failed + requeued
+
+    @staticmethod
+    def purge_finished_jobs(db: Session) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=OCR_JOB_RETENTION_HOURS)
+        purged = db.query(OCRJob).filter(
+            OCRJob.status.in_(["done", "failed"]),
+            OCRJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        return purged
+
+
+def _with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+class OCRJobWorker:
+    """Background consumers that drain the ocr_jobs table through the OCR engine.
+
+    The database is the queue: jobs survive restarts and are picked up by
+    whichever API process polls first. Uploads handled by this process wake
+    the consumers immediately instead of waiting for the next poll.
+    """
+
+    def __init__(self, concurrency: int = OCR_JOB_WORKERS, poll_interval: float = OCR_JOB_POLL_INTERVAL):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_maintenance: Optional[float] = None
+        self._service_seconds = 1.0  # Moving average of the time a job takes
+
+    def retry_after(self, queued: int) -> int:
+        """Seconds until a job queued behind this many others is likely to start"""
+        return max(1, math.ceil(queued / self.concurrency * self._service_seconds))
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle consumers after a job was enqueued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _wait_for_work(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _maintenance(self):
+        loop = asyncio.get_running_loop()
+        if self._last_maintenance is not None and loop.time() - self._last_maintenance < OCR_JOB_STALE_SECONDS:
+            return
+        self._last_maintenance = loop.time()
+        await run_in_threadpool(_with_session, OCRJobService.requeue_stale_jobs)
+        await run_in_threadpool(_with_session, OCRJobService.purge_finished_jobs)
+
+    async def _consume(self):
+        while True:
+            try:
+                await self._maintenance()
+                job = await run_in_threadpool(_with_session, OCRJobService.claim_next)
+                if job is None:
+                    await self._wait_for_work()
+                    continue
+                started = asyncio.get_running_loop().time()
+                await self._process(job.id, job.photo_path, job.device_id)
+                elapsed = asyncio.get_running_loop().time() - started
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in OCR job worker: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process(self, job_id: str, photo_path: str, device_id: Optional[str] = None):
+        try:
+            calibration = await run_in_threadpool(_with_session, DeviceCalibrationService.get_calibration, device_id)
+            ocr_result = await ocr_engine.process_photo(photo_store.path(photo_path), calibration=calibration)
+            photo_transcoder.schedule(photo_path)
+            response = PhotoUploadResponse.from_ocr_result(photo_path, ocr_result)
+        except Exception as e:
+            await run_in_threadpool(_with_session, OCRJobService.fail_job, job_id, f"Error processing image: {str(e)}")
+            return
+        await run_in_threadpool(_with_session, OCRJobService.complete_job, job_id, response)
+
+
+ocr_job_worker = OCRJobWorker()
@@ -0,0 +1,64 @@
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.photo_blob import PhotoBlob
+from app.models.time_entry import TimeEntry
+from app.photo_store import photo_store
+
+class PhotoBlobService:
+    """Reference counts of stored photos.
+
+    The counters change in the caller's transaction and are not committed
+    here, so they are saved together with the time entry that uses the photo.
+    Updates are single UPDATE statements, which keeps concurrent confirms of
+    the same photo from losing a count.
+    """
+
+    @staticmethod
+    def add_reference(db: Session, key: str, size: Optional[int] = None, count: int = 1) -> None:
+        updated = db.query(PhotoBlob).filter(PhotoBlob.key == key).update(
+            {PhotoBlob.ref_count: PhotoBlob.ref_count + count}, synchronize_session=False
+        )
+        if updated:
+            return
+        try:
+            with db.begin_nested():
+                db.add(PhotoBlob(key=key, size=size, ref_count=count))
+        except IntegrityError:
+            # Another request created the row first
+            db.query(PhotoBlob).filter(PhotoBlob.key == key).update(
+                {PhotoBlob.ref_count: PhotoBlob.ref_count + count}, synchronize_session=False
+            )
+
+    @staticmethod
+    def move_references(db: Session, old_path: str, new_key: str, count: int, size: Optional[int] = None) -> None:
+        """Point the counts of count entries from one photo to another, e.g. after transcoding"""
+        db.query(PhotoBlob).filter(PhotoBlob.key == old_path).delete(synchronize_session=False)
+        if count:
+            PhotoBlobService.add_reference(db, new_key, size, count)
+
+    @staticmethod
+    def replace_photo(db: Session, old_path: str, new_key: str, size: Optional[int] = None) -> int:
+        """Point every time entry using a photo at another copy of it, returning how many were moved"""
+        count = db.query(TimeEntry).filter(TimeEntry.photo_path == old_path).update(
+            {TimeEntry.photo_path: new_key}, synchronize_session=False
+        )
+        PhotoBlobService.move_references(db, old_path, new_key, count, size)
+        return count
+
+    @staticmethod
+    def release_reference(db: Session, key: str) -> bool:
+        """Drop one reference, True when no time entry uses the photo any more"""
+        if not photo_store.is_key(key):
+            # Photos stored before the store existed belong to a single entry
+            return True
+        db.query(PhotoBlob).filter(PhotoBlob.key == key, PhotoBlob.ref_count > 0).update(
+            {PhotoBlob.ref_count: PhotoBlob.ref_count - 1}, synchronize_session=False
+        )
+        remaining = db.query(PhotoBlob.ref_count).filter(PhotoBlob.key == key).scalar()
+        if remaining:
+            return False
+        db.query(PhotoBlob).filter(PhotoBlob.key == key).delete(synchronize_session=False)
+        return True
@@ -0,0 +1,142 @@
+import hashlib
+import os
+from typing import BinaryIO, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from .photo_gc import photo_gc
+from .photo_store import UPLOADS_DIR, photo_store
+
+# Upload configuration
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "50"))
+MAX_BURST_FRAMES = int(os.getenv("MAX_BURST_FRAMES", "5"))
+
+# Slack for the multipart envelope when checking Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Magic numbers of the image formats we accept: (offset, signature, media type, extension)
+_IMAGE_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (0, b"GIF87a", "image/gif", ".gif"),
+    (0, b"GIF89a", "image/gif", ".gif"),
+    (0, b"BM", "image/bmp", ".bmp"),
+    (0, b"II*\x00", "image/tiff", ".tif"),
+    (0, b"MM\x00*", "image/tiff", ".tif"),
+    (8, b"WEBP", "image/webp", ".webp"),
+    (4, b"ftypheic", "image/heic", ".heic"),
+    (4, b"ftypheix", "image/heic", ".heic"),
+    (4, b"ftypmif1", "image/heif", ".heif"),
+    (4, b"ftypavif", "image/avif", ".avif"),
+]
+
+class StoredUpload(NamedTuple):
+    key: str  # Photo store key, what TimeEntry.photo_path holds
+    path: str
+    size: int
+    digest: str  # SHA-256 of the content
+    content_type: str
+    created: bool  # False when the same photo was already stored
+
+class _UploadTooLarge(Exception):
+    pass
+
+def media_type_for(extension: str) -> str:
+    """Media type of a stored photo from its file extension"""
+    for _, _, media_type, known in _IMAGE_SIGNATURES:
+        if known == extension.lower():
+            return media_type
+    return "application/octet-stream"
+
+def sniff_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """Detect the image format from the first bytes, as (media type, extension)"""
+    for offset, signature, media_type, extension in _IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if media_type == "image/webp" and not head.startswith(b"RIFF"):
+                continue
+            return media_type, extension
+    return None
+
+def _copy_upload(source: BinaryIO, path: str, max_bytes: int, chunk_size: int) -> Tuple[int, str]:
+    """Copy an upload to disk chunk by chunk, hashing it on the way"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as target:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            size += len(chunk)
+            if size > max_bytes:
+                raise _UploadTooLarge()
+            digest.update(chunk)
+            target.write(chunk)
+        # The file is renamed into the store next; make sure its content is on disk first
+        target.flush()
+        os.fsync(target.fileno())
+    return size, digest.hexdigest()
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+async def store_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredUpload:
+    """Stream an uploaded image into the photo store in fixed-size chunks.
+
+    Only one chunk is held in memory at a time. The content type comes from
+    the file's magic number rather than the client supplied header, and the
+    upload is rejected with 413 as soon as it grows past max_bytes. The hash
+    computed on the way names the stored file.
+    """
+    head = await file.read(32)
+    sniffed = sniff_image_type(head)
+    if sniffed is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an image"
+        )
+    media_type, extension = sniffed
+    await file.seek(0)
+
+    path = photo_store.temp_path(extension)
+    try:
+        size, digest = await run_in_threadpool(_copy_upload, file.file, path, max_bytes, UPLOAD_CHUNK_SIZE)
+        key, created = await run_in_threadpool(photo_store.put_file, path, digest, extension)
+    except _UploadTooLarge:
+        _remove_file(path)
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File is larger than the {max_bytes // (1024 * 1024)} MB limit"
+        )
+    except Exception as e:
+        _remove_file(path)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving file: {str(e)}"
+        )
+
+    return StoredUpload(key=key, path=photo_store.path(key), size=size, digest=digest,
+                        content_type=media_type, created=created)
+
+def discard_upload(upload: StoredUpload) -> None:
+    """Remove a stored upload that will not be used.
+
+    A photo that was already in the store before this upload may belong to a
+    time entry, so only files this upload created are queued for deletion.
+    """
+    if upload.created:
+        photo_gc.enqueue(upload.key)
+
+def upload_request_limit(path: str) -> Optional[int]:
+    """Largest acceptable request body for an upload endpoint, None when unlimited"""
+    path = path.rstrip("/")
+    if path.endswith("/time-entries/upload"):
+        return MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+    if path.endswith("/time-entries/upload-batch"):
+        return (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES) * MAX_BATCH_FILES
+    if path.endswith("/time-entries/upload-burst"):
+        return (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES) * MAX_BURST_FRAMES
+    if "/time-entries/uploads/" in path:
+        # Resumable upload chunks carry raw bytes
+        return MAX_UPLOAD_BYTES
+    return None
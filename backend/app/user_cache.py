@@ -0,0 +1,92 @@
+import os
+import threading
+import time as clock
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .models import User
+
+# Cache configuration; USER_CACHE_SIZE=0 disables it
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+class UserCache:
+    """Users resolved by get_current_user, keyed by the token subject (email).
+
+    Entries are detached copies holding only column values. A hit is merged
+    into the request's session without loading, so the route gets a normal
+    persistent User it can modify, lazy load relationships from and commit,
+    without a SELECT. Entries are dropped when the user is updated through
+    the API; the TTL bounds how long other processes, which are not told
+    about the update, may serve the old values.
+    """
+
+    def __init__(self, max_entries: int = USER_CACHE_SIZE, ttl_seconds: float = USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # Subject -> (stored at, detached user)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, db: Session, subject: str) -> Optional[User]:
+        """The cached user merged into db, None on a miss"""
+        if self.max_entries <= 0:
+            return None
+        now = clock.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            stored_at, cached = entry
+            if now - stored_at > self.ttl_seconds:
+                del self._entries[subject]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(subject)
+            self._stats["hits"] += 1
+        # load=False copies the cached state in as-is instead of querying the row
+        return db.merge(cached, load=False)
+
+    def put(self, subject: str, user: User) -> None:
+        if self.max_entries <= 0:
+            return
+        # A copy, so the entry is never tied to the session the user was loaded in
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        cached = User(**values)
+        make_transient_to_detached(cached)
+        with self._lock:
+            self._entries[subject] = (clock.monotonic(), cached)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, subjects: Iterable[str]) -> None:
+        with self._lock:
+            for subject in subjects:
+                if self._entries.pop(subject, None) is not None:
+                    self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+user_cache = UserCache()
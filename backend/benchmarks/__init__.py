@@ -0,0 +1 @@
+# OCR benchmarks
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare OCR backends (pytesseract subprocess vs persistent tesserocr handle)
+
+Usage:
+    python benchmarks/bench_ocr_backends.py [--iterations N] [image ...]
+
+Without images a set of synthetic clock photos is generated.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ocr_service import OCR_BACKENDS, OCRService
+from benchmarks.synthetic import generate_samples
+
+def load_images(paths):
+    if not paths:
+        return [(f"synthetic-{index}", sample.encoded) for index, sample in enumerate(generate_samples(5))]
+    return [(path, cv2.imread(path)) for path in paths]
+
+def bench_backend(name: str, images, iterations: int) -> dict:
+    try:
+        backend = OCR_BACKENDS[name]()
+    except (ImportError, RuntimeError) as e:
+        return {"backend": name, "error": str(e)}
+
+    service = OCRService(backend=backend)
+    processed = [(label, service.preprocess_image(image)) for label, image in images]
+
+    # Warm up once so model loading is not counted as per-image latency
+    try:
+        backend.image_to_string(processed[0][1])
+    except Exception as e:
+        return {"backend": name, "error": str(e)}
+
+    latencies = []
+    texts = {}
+    for _ in range(iterations):
+        for label, image in processed:
+            start = time.perf_counter()
+            texts[label] = backend.image_to_string(image).strip()
+            latencies.append((time.perf_counter() - start) * 1000)
+    backend.close()
+
+    latencies.sort()
+    return {
+        "backend": name,
+        "images": len(processed),
+        "iterations": iterations,
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "texts": texts,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Photos to run through each backend")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--backends", default=",".join(OCR_BACKENDS), help="Comma separated backend names")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    results = [bench_backend(name, images, args.iterations) for name in args.backends.split(",")]
+
+    ok = [r for r in results if "error" not in r]
+    if len(ok) == 2:
+        for label in ok[0]["texts"]:
+            if ok[0]["texts"][label] != ok[1]["texts"].get(label):
+                print(f"⚠️  Backends disagree on {label}")
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
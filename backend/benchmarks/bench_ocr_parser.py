@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Check and time the OCR text parser against a corpus of OCR outputs
+
+Usage:
+    python benchmarks/bench_ocr_parser.py [--iterations N] [--corpus PATH]
+
+Every corpus entry lists the text Tesseract returned and the start time,
+end time and date the parser must extract from it. The script exits with
+status 1 on any mismatch, then reports how fast the corpus is parsed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ocr_parser import parse_text, start_end_times
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_text_corpus.json")
+
+def parse_entry(text: str) -> dict:
+    parsed = parse_text(text)
+    start, end = start_end_times(parsed.times)
+    return {
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "date": parsed.date.date().isoformat() if parsed.date else None,
+    }
+
+def check_corpus(corpus) -> int:
+    failures = 0
+    for entry in corpus:
+        expected = {key: entry[key] for key in ("start", "end", "date")}
+        actual = parse_entry(entry["text"])
+        if actual != expected:
+            failures += 1
+            print(f"❌ {entry['text']!r}: expected {expected}, got {actual}")
+    return failures
+
+def bench_corpus(corpus, iterations: int) -> dict:
+    texts = [entry["text"] for entry in corpus]
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            parse_text(text)
+    elapsed = time.perf_counter() - started
+    parsed = len(texts) * iterations
+    return {
+        "texts": parsed,
+        "total_ms": round(elapsed * 1000, 2),
+        "per_text_us": round(elapsed / parsed * 1_000_000, 2),
+        "texts_per_second": int(parsed / elapsed),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+
+    failures = check_corpus(corpus)
+    if failures:
+        print(f"\n❌ {failures} of {len(corpus)} corpus entries failed")
+        sys.exit(1)
+    print(f"✅ {len(corpus)} corpus entries parsed correctly")
+
+    print(json.dumps(bench_corpus(corpus, args.iterations), indent=2))
+
+if __name__ == "__main__":
+    main()
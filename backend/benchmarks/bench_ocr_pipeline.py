@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark the OCR pipeline on synthetic clock and timecard photos
+
+Usage:
+    python benchmarks/bench_ocr_pipeline.py [--samples N] [--seed S] [--workers 1,2,4] [--output run.json]
+
+Reports per-stage timings, throughput with N worker processes and an
+accuracy score against the ground truth of each synthetic photo. The JSON
+output can be kept per commit and compared between runs.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import image_quality, ocr_service
+from app.image_quality import ImageQualityError
+from app.ocr_engine import _init_worker, _run_process_photo
+from app.ocr_service import OCRService
+from benchmarks.synthetic import generate_samples
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def score(sample, result: dict) -> dict:
+    """Compare one OCR result with the ground truth of its sample"""
+    suggested_date = result.get("suggested_date")
+    return {
+        "start_time": result["suggested_start_time"] == sample.start_time,
+        "end_time": result["suggested_end_time"] == sample.end_time,
+        "date": suggested_date is not None and suggested_date[:10] == sample.date.isoformat(),
+    }
+
+def run_stages(samples) -> tuple:
+    """Run every sample in-process and collect stage timings and accuracy"""
+    service = OCRService()
+    stages = {}
+    checks = []
+    tiers = {}
+    for sample in samples:
+        started = time.perf_counter()
+        try:
+            result = service.process_photo(sample.encoded)
+        except ImageQualityError as e:
+            # Counted as a miss on every field
+            result = {"suggested_start_time": None, "suggested_end_time": None, "suggested_date": None,
+                      "ocr_tier": f"rejected_{e.reason}", "timings": {}}
+        stages.setdefault("total", []).append((time.perf_counter() - started) * 1000)
+        for stage, elapsed_ms in result["timings"].items():
+            stages.setdefault(stage, []).append(elapsed_ms)
+        checks.append(score(sample, result))
+        tiers[result["ocr_tier"]] = tiers.get(result["ocr_tier"], 0) + 1
+
+    timings = {
+        stage: {
+            "mean_ms": round(statistics.mean(values), 2),
+            "p50_ms": round(percentile(values, 0.5), 2),
+            "p95_ms": round(percentile(values, 0.95), 2),
+        }
+        for stage, values in stages.items()
+    }
+    fields = [value for check in checks for value in check.values()]
+    accuracy = {
+        "field_accuracy": round(sum(fields) / len(fields), 4),
+        "exact_match_rate": round(sum(all(check.values()) for check in checks) / len(checks), 4),
+        **{
+            f"{field}_accuracy": round(sum(check[field] for check in checks) / len(checks), 4)
+            for field in ("start_time", "end_time", "date")
+        },
+        "tier_share": {tier: round(count / len(samples), 4) for tier, count in tiers.items()},
+    }
+    return timings, accuracy
+
+def process_or_reject(image) -> bool:
+    """Worker job of the throughput runs, False when the quality gate rejected the photo"""
+    try:
+        _run_process_photo(image)
+    except ImageQualityError:
+        return False
+    return True
+
+def run_throughput(samples, workers: int) -> dict:
+    """Push every sample through a pool of OCR worker processes"""
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker) as executor:
+        # Start the workers before timing so process start-up is not counted
+        list(executor.map(process_or_reject, [samples[0].encoded] * workers))
+        started = time.perf_counter()
+        processed = list(executor.map(process_or_reject, [sample.encoded for sample in samples]))
+        elapsed = time.perf_counter() - started
+    return {
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "photos_per_second": round(len(samples) / elapsed, 2),
+        "rejected": processed.count(False),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts for the throughput runs")
+    parser.add_argument("--output", help="Write the JSON report to this file as well")
+    args = parser.parse_args()
+
+    samples = generate_samples(args.samples, args.seed)
+    timings, accuracy = run_stages(samples)
+    throughput = [run_throughput(samples, int(workers)) for workers in args.workers.split(",")]
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "samples": args.samples,
+            "seed": args.seed,
+            "ocr_backend": ocr_service.OCR_BACKEND,
+            "ocr_max_pixels": ocr_service.OCR_MAX_PIXELS,
+            "ocr_roi_enabled": ocr_service.OCR_ROI_ENABLED,
+            "ocr_tiered": ocr_service.OCR_TIERED,
+            "ocr_segment_fastpath": ocr_service.OCR_SEGMENT_FASTPATH,
+            "ocr_segment_min_confidence": ocr_service.OCR_SEGMENT_MIN_CONFIDENCE,
+            "quality_gate": image_quality.quality_thresholds(),
+        },
+        "stages": timings,
+        "throughput": throughput,
+        "accuracy": accuracy,
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Check the S3 photo storage driver against an S3-compatible server
+
+Usage:
+    python benchmarks/check_photo_storage.py [--endpoint-url URL] [--bucket NAME]
+
+Without an endpoint a local moto server is started (pip install "moto[server]");
+pass the URL of a MinIO or other S3-compatible server to check against it
+instead, with credentials in the usual AWS environment variables. Runs every
+driver method plus publish() on a throwaway photo store and exits non-zero
+when a check fails.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.photo_storage import PHOTO_STORAGE_CHUNK_SIZE, S3PhotoStorage
+from app.photo_store import PhotoStore
+
+def start_moto():
+    """A moto server on a free local port, as (server, endpoint URL)"""
+    from moto.server import ThreadedMotoServer
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+def ensure_bucket(storage: S3PhotoStorage, region: str):
+    client = storage._client
+    try:
+        client.head_bucket(Bucket=storage.bucket)
+    except storage._client_error:
+        if region == "us-east-1":
+            client.create_bucket(Bucket=storage.bucket)
+        else:
+            client.create_bucket(Bucket=storage.bucket, CreateBucketConfiguration={"LocationConstraint": region})
+
+def stored_photo(store: PhotoStore, content: bytes, extension: str = ".jpg") -> str:
+    """Write content into the store as a photo, returning its key"""
+    source = store.temp_path(extension)
+    with open(source, "wb") as f:
+        f.write(content)
+    key, _ = store.put_file(source, hashlib.sha256(content).hexdigest(), extension)
+    return key
+
+def run_checks(storage: S3PhotoStorage, store: PhotoStore) -> list:
+    results = []
+
+    def check(name: str, ok: bool, detail=None):
+        results.append({"check": name, "ok": bool(ok), **({"detail": detail} if detail is not None else {})})
+
+    # Larger than a chunk, so reads span several chunks
+    content = os.urandom(PHOTO_STORAGE_CHUNK_SIZE + 12345)
+    key = stored_photo(store, content)
+    started = time.time()
+
+    check("stat missing", storage.stat(key) is None)
+
+    storage.put(key, store.path(key))
+    stored = storage.stat(key)
+    check("put + stat", stored is not None and stored.key == key and stored.size == len(content),
+          stored._asdict() if stored else None)
+    check("stat modified", stored is not None and abs(stored.modified - started) < 300)
+
+    chunks = list(storage.iter_bytes(key))
+    check("iter_bytes", b"".join(chunks) == content, {"chunks": len(chunks)})
+    check("iter_bytes range", b"".join(storage.iter_bytes(key, 100, 199)) == content[100:200])
+    check("iter_bytes open range", b"".join(storage.iter_bytes(key, len(content) - 10)) == content[-10:])
+
+    target = os.path.join(store.temp_dir, "fetched")
+    storage.fetch(key, target)
+    with open(target, "rb") as f:
+        check("fetch", f.read() == content)
+
+    url = storage.presigned_url(key)
+    with urllib.request.urlopen(url, timeout=10) as response:
+        check("presigned_url", response.read() == content)
+
+    scanned = {item.key: item for item in storage.scan()}
+    check("scan", key in scanned and scanned[key].size == len(content), sorted(scanned))
+
+    # publish() copies the photo and leaves the local file to the garbage collector
+    published = stored_photo(store, os.urandom(2048), ".webp")
+    asyncio.run(storage.publish(published, store))
+    remote = storage.stat(published)
+    check("publish", remote is not None and remote.size == 2048)
+    check("publish keeps local copy", store.exists(published))
+
+    check("delete", storage.delete(key) and storage.stat(key) is None)
+    storage.delete(published)
+    check("scan after delete", not {key, published} & {item.key for item in storage.scan()})
+
+    check("stat invalid key", storage.stat("../escape.jpg") is None)
+    try:
+        storage.put("../escape.jpg", target)
+        check("put invalid key", False)
+    except ValueError:
+        check("put invalid key", True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint-url", default=None, help="S3-compatible server; a moto server is started when omitted")
+    parser.add_argument("--bucket", default="smartponto-storage-check")
+    parser.add_argument("--region", default=os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = args.endpoint_url
+    if endpoint_url is None:
+        try:
+            server, endpoint_url = start_moto()
+        except ImportError as e:
+            print(f"⚠️  Skipping: no --endpoint-url and moto is not installed ({e})")
+            return 0
+
+    root = tempfile.mkdtemp(prefix="photo-storage-check-")
+    try:
+        store = PhotoStore(root=root, temp_dir=os.path.join(root, ".tmp"))
+        # A prefix of its own, so a shared bucket is left as it was
+        storage = S3PhotoStorage(bucket=args.bucket, prefix=f"check-{os.getpid()}/", endpoint_url=endpoint_url,
+                                 region=args.region, store=store)
+        ensure_bucket(storage, args.region)
+        results = run_checks(storage, store)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        if server is not None:
+            server.stop()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    failed = [r["check"] for r in results if not r["ok"]]
+    if failed:
+        print(f"❌ {len(failed)} checks failed: {', '.join(failed)}")
+        return 1
+    print(f"✅ {len(results)} checks passed against {endpoint_url}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
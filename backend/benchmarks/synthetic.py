@@ -0,0 +1,145 @@
+"""
+Synthetic clock and timecard photos with known ground truth
+"""
+import glob
+import io
+import random
+from datetime import date, time, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+# Fonts commonly installed on Linux images, the PIL default font is the fallback
+FONT_PATTERNS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans*.ttf",
+    "/usr/share/fonts/truetype/liberation*/Liberation*.ttf",
+    "/usr/share/fonts/truetype/freefont/Free*.ttf",
+    "/usr/share/fonts/TTF/*.ttf",
+]
+
+# Lit segments (a-g) of each digit on a seven-segment display
+SEGMENTS = {
+    "0": "abcdef", "1": "bc", "2": "abdeg", "3": "abcdg", "4": "bcfg",
+    "5": "acdfg", "6": "acdefg", "7": "abc", "8": "abcdefg", "9": "abcdfg",
+}
+
+class SyntheticSample(NamedTuple):
+    kind: str  # "clock", "timecard" or "led"
+    encoded: bytes  # JPEG bytes, as a phone would upload them
+    start_time: time
+    end_time: Optional[time]
+    date: date
+    text: str
+
+def available_fonts() -> List[str]:
+    fonts = []
+    for pattern in FONT_PATTERNS:
+        fonts.extend(sorted(glob.glob(pattern)))
+    return fonts
+
+def _load_font(fonts: List[str], rng: random.Random, size: int):
+    if fonts:
+        return ImageFont.truetype(rng.choice(fonts), size)
+    return ImageFont.load_default(size=size)
+
+def _random_time(rng: random.Random, earliest: int, latest: int) -> time:
+    minutes = rng.randint(earliest * 60, latest * 60 - 1)
+    return time(minutes // 60, minutes % 60)
+
+def draw_segment_text(draw: ImageDraw.ImageDraw, origin, text: str, height: int, fill: int) -> Tuple[int, int]:
+    """Draw text the way a seven-segment clock display shows it, returns the size used"""
+    x0, y0 = origin
+    width = height // 2
+    thick = max(2, height // 10)
+    gap = max(1, thick // 3)
+    max_x = x0
+    for line_index, line in enumerate(text.split("\n")):
+        x = x0
+        y = y0 + line_index * int(height * 1.4)
+        mid = y + height // 2
+        for char in line:
+            if char in SEGMENTS:
+                boxes = {
+                    "a": (x + gap, y, x + width - gap, y + thick),
+                    "b": (x + width - thick, y + gap, x + width, mid - gap),
+                    "c": (x + width - thick, mid + gap, x + width, y + height - gap),
+                    "d": (x + gap, y + height - thick, x + width - gap, y + height),
+                    "e": (x, mid + gap, x + thick, y + height - gap),
+                    "f": (x, y + gap, x + thick, mid - gap),
+                    "g": (x + gap, mid - thick // 2, x + width - gap, mid + thick // 2),
+                }
+                for segment in SEGMENTS[char]:
+                    draw.rectangle(boxes[segment], fill=fill)
+                x += width + thick * 2
+            elif char == ":":
+                dot = thick
+                draw.rectangle((x, y + height // 4, x + dot, y + height // 4 + dot), fill=fill)
+                draw.rectangle((x, y + 3 * height // 4 - dot, x + dot, y + 3 * height // 4), fill=fill)
+                x += dot + thick * 2
+            elif char == ".":
+                draw.rectangle((x, y + height - thick, x + thick, y + height), fill=fill)
+                x += thick * 3
+            elif char == "-":
+                draw.rectangle((x, mid - thick // 2, x + width // 2, mid + thick // 2), fill=fill)
+                x += width // 2 + thick * 2
+            elif char == "/":
+                draw.line((x + width // 2, y, x, y + height), fill=fill, width=thick)
+                x += width // 2 + thick * 2
+        max_x = max(max_x, x)
+    lines = text.count("\n") + 1
+    return max_x - x0, int(height * 1.4) * (lines - 1) + height
+
+def generate_sample(rng: random.Random, fonts: List[str], size=(1600, 1200)) -> SyntheticSample:
+    """Render one photo: a display panel with the text, then camera-like degradations"""
+    kind = rng.choice(["clock", "timecard", "led"])
+    punch_date = date(2024, 1, 1) + timedelta(days=rng.randint(0, 730))
+    start = _random_time(rng, 6, 12)
+    end = _random_time(rng, 13, 20) if kind == "timecard" else None
+
+    date_text = punch_date.strftime(rng.choice(["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y"]))
+    if kind in ("clock", "led"):
+        text = f"{start.strftime('%H:%M')}\n{date_text}"
+    else:
+        text = f"ENTRADA {start.strftime('%H:%M')}\nSAIDA {end.strftime('%H:%M')}\n{date_text}"
+
+    # Background with a lighter display panel somewhere in the frame
+    background = rng.randint(60, 160)
+    image = Image.new("L", size, background)
+    draw = ImageDraw.Draw(image)
+    font = _load_font(fonts, rng, rng.randint(56, 110))
+    box = draw.multiline_textbbox((0, 0), text, font=font, spacing=20)
+    text_w, text_h = box[2] - box[0], box[3] - box[1]
+    pad = 40
+    x = rng.randint(pad, max(pad, size[0] - text_w - 2 * pad))
+    y = rng.randint(pad, max(pad, size[1] - text_h - 2 * pad))
+    if kind == "led":
+        # Lit segments on a dark display
+        digit_height = rng.randint(70, 130)
+        text_w, text_h = draw_segment_text(ImageDraw.Draw(Image.new("L", (1, 1))), (0, 0), text, digit_height, 0)
+        x = rng.randint(pad, max(pad, size[0] - text_w - 2 * pad))
+        y = rng.randint(pad, max(pad, size[1] - text_h - 2 * pad))
+        draw.rectangle((x - pad, y - pad, x + text_w + pad, y + text_h + pad), fill=rng.randint(10, 40))
+        draw_segment_text(draw, (x, y), text, digit_height, rng.randint(200, 250))
+    else:
+        draw.rectangle((x - pad, y - pad, x + text_w + pad, y + text_h + pad), fill=rng.randint(200, 250))
+        draw.multiline_text((x, y - box[1]), text, fill=rng.randint(0, 40), font=font, spacing=20)
+
+    # Camera degradations: tilt, defocus and sensor noise
+    image = image.rotate(rng.uniform(-6, 6), resample=Image.BICUBIC, fillcolor=background)
+    blur = rng.uniform(0, 1.8)
+    if blur > 0.3:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels += np.random.default_rng(rng.getrandbits(32)).normal(0, rng.uniform(2, 12), pixels.shape)
+    pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(cv2.cvtColor(pixels, cv2.COLOR_GRAY2RGB)).save(buffer, "JPEG", quality=rng.randint(70, 92))
+    return SyntheticSample(kind, buffer.getvalue(), start, end, punch_date, text)
+
+def generate_samples(count: int, seed: int = 0) -> List[SyntheticSample]:
+    rng = random.Random(seed)
+    fonts = available_fonts()
+    return [generate_sample(rng, fonts) for _ in range(count)]
@@ -96,6 +96,15 @@ def check_database():
                 for user in admin_users:
                     print(f"   - {user[0]} ({user[1]})")
 
+            # Bancos criados antes da calibração por terminal têm ocr_jobs sem device_id; create_all não adiciona colunas
+            if 'ocr_jobs' in tables:
+                job_columns = [col['name'] for col in inspector.get_columns('ocr_jobs')]
+                if 'device_id' not in job_columns:
+                    print("⚠️  Coluna 'device_id' não encontrada em 'ocr_jobs'. Adicionando...")
+                    with conn.begin():
+                        conn.execute(text("ALTER TABLE ocr_jobs ADD COLUMN device_id VARCHAR"))
+                        print("✅ Coluna 'device_id' adicionada")
+
             # Verificar outras tabelas
             required_tables = ['time_entries', 'monthly_targets']
             for table in required_tables:
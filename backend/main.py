@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.routers import auth, time_entries, users, monthly_targets, admin, permissions
 from app.database import engine
 from app.database import Base
+from app.ocr_engine import ocr_engine
+from app.services.ocr_job_service import ocr_job_worker
+from app.uploads import upload_request_limit
+from app.admission import ocr_admission
+from app.resumable_uploads import partial_upload_sweeper
+from app.photo_gc import photo_gc
+from app.photo_transcode import photo_transcoder
 import os
 
 # Create database tables
@@ -21,13 +29,45 @@ allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://127
 if os.getenv("DEBUG", "false").lower() == "true":
     allowed_origins = ["*"]
 
-# Configure CORS
+# Reject oversized uploads from Content-Length before the body is parsed
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    limit = upload_request_limit(request.url.path)
+    content_length = request.headers.get("content-length")
+    if limit is not None and content_length and content_length.isdigit() and int(content_length) > limit:
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": "Upload is too large"}
+        )
+    return await call_next(request)
+
+# Shed OCR uploads while the OCR queue is full, before their body is received.
+# Deferred uploads go to the job queue, which enforces its own limits.
+@app.middleware("http")
+async def shed_ocr_load(request: Request, call_next):
+    path = request.url.path.rstrip("/")
+    is_ocr_upload = path.endswith(("/time-entries/upload", "/time-entries/upload-burst")) or (
+        "/time-entries/uploads/" in path and path.endswith("/finalize")
+    )
+    if is_ocr_upload and request.query_params.get("defer") != "true" and ocr_admission.overloaded():
+        rejected = ocr_admission.shed()
+        return JSONResponse(
+            status_code=rejected.status_code,
+            content={"detail": rejected.detail},
+            headers={"Retry-After": str(rejected.retry_after)}
+        )
+    return await call_next(request)
+
+# Configure CORS; added after the middlewares above so it wraps them and their
+# error responses also carry the CORS headers. Retry-After is exposed so the
+# frontend can read it from 429 and 503 responses.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 # Include routers
@@ -38,6 +78,20 @@ app.include_router(monthly_targets.router, prefix="/monthly-targets", tags=["Mon
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 app.include_router(permissions.router, prefix="/permissions", tags=["Permissions"])
 
+@app.on_event("startup")
+async def start_ocr_job_worker():
+    ocr_job_worker.start()
+    partial_upload_sweeper.start()
+    photo_gc.start()
+
+@app.on_event("shutdown")
+async def shutdown_ocr_engine():
+    await ocr_job_worker.stop()
+    await partial_upload_sweeper.stop()
+    await photo_gc.stop()
+    ocr_engine.shutdown()
+    photo_transcoder.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "SmartPonto API is running!"}
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Script para mover as fotos antigas do armazenamento local para arquivos de
+pacote (PHOTO_PACK_DIR), reduzindo o número de arquivos no disco
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import Base, SessionLocal, engine
+from app.models import PhotoPackEntry, TimeEntry
+from app.photo_packs import photo_packs, PHOTO_PACK_AGE_MONTHS
+from app.photo_store import photo_store
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+def months_ago(months: int) -> date:
+    today = date.today()
+    month = today.month - months
+    year = today.year + (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return date(year, month, min(today.day, 28))
+
+def pack(months: int, batch_size: int, limit: int = None) -> dict:
+    """Empacota as fotos de registros mais antigos que o limite e remove os arquivos soltos"""
+    report = {"photos": 0, "packed": 0, "already_packed": 0, "missing": 0, "failed": 0, "bytes": 0}
+    cutoff = months_ago(months)
+    db = SessionLocal()
+    try:
+        # Fotos ainda usadas por um registro recente também podem ir para o pacote
+        query = (
+            db.query(TimeEntry.photo_path)
+            .filter(TimeEntry.photo_path.isnot(None), TimeEntry.date < cutoff)
+            .distinct()
+        )
+        paths = [row[0] for row in (query.limit(limit) if limit else query) if photo_store.is_key(row[0])]
+        report["photos"] = len(paths)
+        print(f"🔍 {len(paths)} fotos de registros anteriores a {cutoff.strftime('%d/%m/%Y')}")
+
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            # Outro processo empacotando ao mesmo tempo espera aqui, antes de consultar o índice
+            with photo_packs.writing():
+                packed = {key for (key,) in db.query(PhotoPackEntry.key).filter(PhotoPackEntry.key.in_(batch))}
+
+                sources = []
+                for key in batch:
+                    full_path = photo_store.path(key)
+                    if not os.path.exists(full_path):
+                        if key not in packed:
+                            report["missing"] += 1
+                        else:
+                            report["already_packed"] += 1
+                        continue
+                    if key in packed:
+                        # Enviada de novo depois de empacotada; a cópia solta sobra
+                        photo_store.remove(key)
+                        report["already_packed"] += 1
+                        continue
+                    sources.append((key, full_path))
+
+                written = photo_packs.append(sources)
+                report["failed"] += len(sources) - len(written)
+                if not written:
+                    continue
+
+                # O índice é gravado antes de apagar os arquivos soltos; uma falha aqui só deixa bytes sem uso no pacote
+                for key, pack_name, offset, size in written:
+                    db.add(PhotoPackEntry(key=key, pack=pack_name, offset=offset, size=size))
+                db.commit()
+                for key, _, _, size in written:
+                    photo_store.remove(key)
+                    report["packed"] += 1
+                    report["bytes"] += size
+                print(f"✅ {start + len(batch)}/{len(paths)} fotos processadas")
+    finally:
+        db.close()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move as fotos antigas para arquivos de pacote")
+    parser.add_argument("--months", type=int, default=PHOTO_PACK_AGE_MONTHS, help="Idade mínima dos registros em meses")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=None, help="Empacotar no máximo este número de fotos")
+    args = parser.parse_args()
+
+    # Garante que a tabela do índice existe
+    Base.metadata.create_all(bind=engine)
+
+    report = pack(args.months, args.batch_size, args.limit)
+
+    print(f"\n📋 {report['photos']} fotos: {report['packed']} empacotadas ({format_bytes(report['bytes'])}), "
+          f"{report['already_packed']} já empacotadas, {report['missing']} não encontradas, {report['failed']} com erro")
+    sys.exit(1 if report["failed"] else 0)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Script para converter as fotos já armazenadas para o formato compacto
+(PHOTO_TRANSCODE_FORMAT, PHOTO_TRANSCODE_QUALITY e PHOTO_TRANSCODE_MAX_SIDE)
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.models import TimeEntry
+from app.photo_gc import photo_gc
+from app.photo_packs import photo_packs
+from app.photo_storage import stat_photo
+from app.photo_store import photo_store
+from app.photo_transcode import photo_transcoder, transcode_enabled, PHOTO_TRANSCODE_FORMAT
+from app.services.photo_blob_service import PhotoBlobService
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+def transcode_photo(photo_path: str):
+    try:
+        return photo_path, photo_transcoder.transcode(photo_path), None
+    except Exception as e:
+        return photo_path, None, e
+
+def migrate(workers: int, limit: int = None) -> dict:
+    """Converte as fotos referenciadas por registros de ponto e atualiza as referências"""
+    report = {"photos": 0, "transcoded": 0, "skipped": 0, "missing": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    db = SessionLocal()
+    try:
+        query = db.query(TimeEntry.photo_path).filter(TimeEntry.photo_path.isnot(None)).distinct()
+        paths = [row[0] for row in (query.limit(limit) if limit else query)]
+
+        pending = []
+        for photo_path in paths:
+            full_path = photo_store.resolve(photo_path)
+            if full_path is None or not os.path.exists(full_path):
+                if stat_photo(photo_path) is not None or (photo_store.is_key(photo_path) and photo_packs.locate(db, photo_path)):
+                    # Já publicada no armazenamento remoto, que só recebe fotos convertidas, ou empacotada
+                    report["skipped"] += 1
+                    continue
+                print(f"⚠️  Foto não encontrada: {photo_path}")
+                report["missing"] += 1
+            else:
+                pending.append(photo_path)
+        report["photos"] = len(paths)
+
+        # Pillow libera o GIL durante a codificação, então threads bastam
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for photo_path, result, error in executor.map(transcode_photo, pending):
+                if error is not None:
+                    print(f"❌ Erro ao converter {photo_path}: {error}")
+                    report["failed"] += 1
+                    continue
+                report["bytes_before"] += result.original_bytes
+                report["bytes_after"] += result.stored_bytes
+                if not result.transcoded:
+                    report["skipped"] += 1
+                    continue
+
+                # Apontar os registros para a nova foto antes de liberar a original
+                PhotoBlobService.replace_photo(db, photo_path, result.key, result.stored_bytes)
+                db.commit()
+                # Um envio idêntico ainda não confirmado ou um job de OCR pode usar a original; o coletor decide
+                photo_gc.enqueue(photo_path)
+                report["transcoded"] += 1
+                print(f"✅ {photo_path} -> {result.key} ({format_bytes(result.original_bytes)} -> {format_bytes(result.stored_bytes)})")
+    finally:
+        db.close()
+
+    # Originais sem referência e fora do período de carência são apagadas agora, as demais numa próxima varredura
+    report["originals_deleted"] = photo_gc.delete_queued()["files"]
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte as fotos armazenadas para o formato compacto")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--limit", type=int, default=None, help="Converter no máximo este número de fotos")
+    args = parser.parse_args()
+
+    if not transcode_enabled():
+        print(f"❌ Formato de conversão inválido ou desativado: {PHOTO_TRANSCODE_FORMAT}")
+        sys.exit(1)
+
+    print(f"🔍 Convertendo fotos para {PHOTO_TRANSCODE_FORMAT}...")
+    report = migrate(args.workers, args.limit)
+
+    print(f"\n📋 {report['photos']} fotos: {report['transcoded']} convertidas, {report['skipped']} mantidas, "
+          f"{report['missing']} não encontradas, {report['failed']} com erro, {report['originals_deleted']} originais apagadas")
+    print(f"💾 {format_bytes(report['bytes_before'])} -> {format_bytes(report['bytes_after'])} "
+          f"({format_bytes(report['bytes_saved'])} economizados)")
+    sys.exit(1 if report["failed"] else 0)
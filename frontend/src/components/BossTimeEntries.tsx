@@ -117,12 +117,13 @@ const BossTimeEntries: React.FC = () => {
       if (!filename) return;
 
       console.log(`Loading photo for entry ${entryId}: ${filename}`);
-      console.log(`URL: ${API_URL}/admin/photos/${filename}`);
+      console.log(`URL: ${API_URL}/admin/photos/${filename}?size=thumb`);
 
       const token = localStorage.getItem('token');
       console.log(`Token: ${token ? 'Present' : 'Missing'}`);
 
-      const response = await fetch(`${API_URL}/admin/photos/${filename}`, {
+      // The list only shows small previews; the original is loaded when one is opened
+      const response = await fetch(`${API_URL}/admin/photos/${filename}?size=thumb`, {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
@@ -145,6 +146,29 @@ const BossTimeEntries: React.FC = () => {
     }
   };
 
+  const openPhoto = async (photoPath: string, alt: string) => {
+    const filename = photoPath.split('/').pop();
+    if (!filename) return;
+
+    try {
+      const token = localStorage.getItem('token');
+      const response = await fetch(`${API_URL}/admin/photos/${filename}`, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        },
+      });
+
+      if (response.ok) {
+        const blob = await response.blob();
+        setSelectedPhoto({ url: URL.createObjectURL(blob), alt });
+      } else {
+        console.error(`Failed to load photo: ${response.status} ${response.statusText}`);
+      }
+    } catch (err) {
+      console.error('Error loading photo:', err);
+    }
+  };
+
   if (!hasPermission('view_all_time_entries')) {
     return (
       <div className="bg-red-50 border border-red-200 rounded-lg p-4">
@@ -330,10 +354,10 @@ const BossTimeEntries: React.FC = () => {
                             src={photoUrls[entry.id]}
                             alt="Foto do ponto"
                             className="w-full h-full object-cover"
-                            onClick={() => setSelectedPhoto({
-                              url: photoUrls[entry.id],
-                              alt: `Foto do ponto - ${entry.user.full_name || entry.user.username} - ${formatDate(entry.date)}`
-                            })}
+                            onClick={() => openPhoto(
+                              entry.photo_path as string,
+                              `Foto do ponto - ${entry.user.full_name || entry.user.username} - ${formatDate(entry.date)}`
+                            )}
                             onError={(e) => {
                               const target = e.target as HTMLImageElement;
                               target.src = 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTI4IiBoZWlnaHQ9IjEyOCIgdmlld0JveD0iMCAwIDEyOCAxMjgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxyZWN0IHdpZHRoPSIxMjgiIGhlaWdodD0iMTI4IiBmaWxsPSIjRjNGNEY2Ii8+CjxwYXRoIGQ9Ik02NCAzMkM3My42NTY5IDMyIDgxLjMzMzMgMzkuNjc2NyA4MS4zMzMzIDQ5LjMzMzNDODEuMzMzMyA1OC45OSA3My42NTY5IDY2LjY2NjcgNjQgNjYuNjY2N0M1NC4zNDMxIDY2LjY2NjcgNDYuNjY2NyA1OC45OSA0Ni42NjY3IDQ5LjMzMzNDNDYuNjY2NyAzOS42NzY3IDU0LjM0MzEgMzIgNjQgMzJaIiBmaWxsPSIjOUI5QkEwIi8+CjxwYXRoIGQ9Ik02NCA3MkM0Ny40MzE1IDcyIDM0IDU4LjU2ODUgMzQgNDJDMzQgMjUuNDMxNSA0Ny40MzE1IDEyIDY0IDEyQzgwLjU2ODUgMTIgOTQgMjUuNDMxNSA5NCA0MkM5NCA1OC41Njg1IDgwLjU2ODUgNzIgNjQgNzJaIiBmaWxsPSIjOUI5QkEwIi8+Cjwvc3ZnPgo=';
@@ -380,6 +404,7 @@ const BossTimeEntries: React.FC = () => {
                   {/* Botão de fechar */}
                   <button
                     onClick={() => {
+                      URL.revokeObjectURL(selectedPhoto.url);
                       setSelectedPhoto(null);
                       setPhotoFitScreen(false);
                     }}
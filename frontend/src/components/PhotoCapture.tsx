@@ -194,6 +194,9 @@ const PhotoCapture: React.FC = () => {
       if (err.response?.data) {
         if (typeof err.response.data === 'string') {
           errorMessage = err.response.data;
+        } else if (err.response.data.detail?.reason) {
+          // Rejected by the quality gate, the message asks for a retake
+          errorMessage = err.response.data.detail.message;
         } else if (err.response.data.detail) {
           errorMessage = err.response.data.detail;
         } else if (err.response.data.message) {